@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark of workbook writing: pd.ExcelWriter/to_excel against the streaming writer in export.py.
+
+    python -m benchmarks.export [--rows N] [--repeat R]
+
+Writes a per-day table with N rows (default 200000) and a describe() table with the same kind of layout as
+tid_deltas_dag.xlsx with both writers, and prints the best write time and the peak Python memory (tracemalloc) of
+each.
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from remissfl.export import write_xlsx, write_siblings
+
+
+def per_day_table(rows: int) -> DataFrame:
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2010-01-01', periods=rows, freq='h')
+    return DataFrame({'datum': days.strftime('%Y-%m-%d'), 'year': days.year, 'month': days.month,
+                      'weekday': days.weekday, 'modalitet': rng.choice(['DT', 'Rtg', 'Glys', 'Ulj'], rows),
+                      'antal': rng.integers(0, 50, rows), 'delta_t': rng.exponential(3.0, rows)})
+
+
+def pandas_writer(path: str, table: DataFrame, heading: str = None, index: bool = True):
+    w = pd.ExcelWriter(path)
+    table.to_excel(w, startcol=0, startrow=3 if heading else 0, index=index)
+    if heading:
+        w.sheets['Sheet1'].write_string(0, 0, heading)
+    w.close()
+
+
+def measure(fn, *args, repeat: int = 3, **kwargs) -> tuple:
+    """Return the best wall time and the peak traced memory in MB of calling fn"""
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - t)
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    table = per_day_table(args.rows)
+    described = table.groupby(['year', 'month', 'weekday'])[['delta_t']].describe()
+    cases = [('per dag, {} rader'.format(len(table)), table, None, False),
+             ('describe, {} rader'.format(len(described)), described, 'Rubrik', True)]
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'bench.xlsx')
+        print('{:<28} {:<22} {:>10} {:>12}'.format('tabell', 'skrivare', 'tid (s)', 'minne (MB)'))
+        for name, t, heading, index in cases:
+            for label, fn in [('pd.ExcelWriter', pandas_writer), ('export.write_xlsx', write_xlsx),
+                              ('export.write_siblings', write_siblings)]:
+                kwargs = {'index': index} if fn is write_siblings else {'heading': heading, 'index': index}
+                seconds, mb = measure(fn, path, t, repeat=args.repeat, **kwargs)
+                print('{:<28} {:<22} {:>10.2f} {:>12.1f}'.format(name, label, seconds, mb))
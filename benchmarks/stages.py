@@ -0,0 +1,137 @@
+"""Benchmark of the pipeline stages on synthetic dumps (see synthetic.py).
+
+    python -m benchmarks.stages [--rows 10000 100000 ...] [--stages load ...] [--jobs N] [--compare VERSION]
+
+For every size a synthetic dump is generated (and kept in --data-dir for later runs) and the stages of
+pipeline.Analysis are run in order, each one on top of the stages before it. Each stage is run once for the wall
+time and once more, on a fresh Analysis, for the peak Python memory (tracemalloc). Plotting runs in this process in
+the memory run so that it is traced.
+
+Results are appended to --results (JSON lines) with the git version of the tree, and every row is printed next to
+the last stored result for the same stage and size of another version, or of --compare.
+"""
+
+import os
+import json
+import time
+import argparse
+import datetime
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from remissfl.ingest import convert_dump, store_path_for, feather
+from remissfl.pipeline import Analysis, TABLES
+from .synthetic import write_dump
+
+
+# Steg i körordning -> funktion som kör steget på en Analysis (tidigare steg är redan beräknade).
+STAGES = {
+    'load': lambda a, jobs: a.raw,
+    'is_acute': lambda a, jobs: a.acute,
+    'classification': lambda a, jobs: a.classification,
+    'intervals': lambda a, jobs: a.akuta,
+    'aggregation': lambda a, jobs: [a.table(name) for name in TABLES],
+    'xlsx': lambda a, jobs: a.write_workbooks(),
+    'plotting': lambda a, jobs: a.render_figures(jobs)
+}
+
+RESULTS = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+
+
+def version() -> str:
+    """The git commit of the tree, with '+' if there are uncommitted changes"""
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return 'okänd'
+    return rev.stdout.strip() + ('+' if dirty.stdout.strip() else '')
+
+
+def synthetic_dump(data_dir: str, rows: int, seed: int) -> str:
+    path = os.path.join(data_dir, 'syntetisk_{}_{}.csv'.format(rows, seed))
+    if not os.path.exists(path):
+        print('Genererar {}...'.format(path))
+        write_dump(path, rows, seed)
+    return path
+
+
+def run_stages(dump: str, stages: list, jobs: int = None, traced: bool = False) -> dict:
+    """Run the stages in order on a new Analysis of dump, returning seconds (or peak MB if traced) per stage"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        for d in ('selections', 'xlsx', 'figures'):
+            os.makedirs(os.path.join(work_dir, d))
+        analysis = Analysis(dump, work_dir)
+        measured = {}
+        for name in STAGES:
+            if traced:
+                tracemalloc.start()
+            t = time.perf_counter()
+            STAGES[name](analysis, 1 if traced else jobs)
+            seconds = time.perf_counter() - t
+            if traced:
+                measured[name] = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+            else:
+                measured[name] = seconds
+            if name == stages[-1]:
+                break
+        return {name: measured[name] for name in stages}
+
+
+def load_results(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous(results: list, row: dict, compare: str = None) -> dict:
+    """The last stored result for the stage and size of row, from version compare or else any other version"""
+    for r in reversed(results):
+        if r['stage'] == row['stage'] and r['rows'] == row['rows'] and \
+                (r['version'] == compare if compare else r['version'] != row['version']):
+            return r
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=None, help='antal processer som ritar figurer')
+    parser.add_argument('--data-dir', default=tempfile.gettempdir(), help='katalog för genererade dumpar')
+    parser.add_argument('--results', default=RESULTS, help='JSONL-fil som resultaten läggs till i')
+    parser.add_argument('--compare', default=None, help='version att jämföra med (standard: senaste andra)')
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if s in args.stages]
+    results = load_results(args.results)
+    common = {'version': version(), 'tid': datetime.datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__}
+
+    print('{:>10} {:<15} {:>10} {:>12} {:>14}'.format('rader', 'steg', 'tid (s)', 'minne (MB)', 'jämfört (tid)'))
+    with open(args.results, 'a', encoding='utf-8') as out:
+        for rows in args.rows:
+            dump = synthetic_dump(args.data_dir, rows, args.seed)
+            if feather is not None:
+                # Mät inläsning från den kolumnlagrade kopian, som i en vanlig körning.
+                if not os.path.exists(store_path_for(dump)):
+                    convert_dump(dump)
+            seconds = run_stages(dump, stages, args.jobs)
+            peaks = run_stages(dump, stages, traced=True)
+            for stage in stages:
+                row = dict(common, rows=rows, stage=stage, seconds=round(seconds[stage], 4),
+                           peak_mb=round(peaks[stage], 1))
+                before = previous(results, row, args.compare)
+                ratio = '' if before is None else '{:.2f}x {}'.format(row['seconds'] / max(before['seconds'], 1e-9),
+                                                                     before['version'])
+                print('{:>10} {:<15} {:>10.2f} {:>12.1f} {:>14}'.format(rows, stage, row['seconds'], row['peak_mb'],
+                                                                       ratio))
+                out.write(json.dumps(row, ensure_ascii=False) + '\n')
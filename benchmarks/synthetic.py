@@ -0,0 +1,199 @@
+"""Synthetic RIS dumps with the schema of ingest.DTYPES, for measuring the pipeline without the real dump.
+
+    python -m benchmarks.synthetic <dump.csv> [--rows N] [--seed S]
+
+The dump is written in chunks, so its size is only limited by the disk (10k - 100M rows). The distributions are
+rough imitations of the real dump:
+
+* 'undersokning' is drawn from the strings in selections/*.txt with a mix per modality and a Zipf distribution
+  within each modality, so that a few hundred strings cover most referrals. A small share of rows gets a typo or
+  an extra word, which gives the long tail of unique free text strings. Without selections/ a small built-in
+  vocabulary is used.
+* The referrals grow by a few percent per year, are fewer on weekends and follow a day profile with its peak
+  around lunch.
+* Up to SECTRA_START, 'prioritet' holds the Carestream priority and 'akut' is empty. From then on 'prioritet' is
+  empty and 'akut' is 0 or 1.
+* The turnaround time is log-normal, shorter for acute referrals. A small share is never answered.
+"""
+
+import os
+import glob
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import Dict, Iterator, List
+
+from remissfl.ingest import DTYPES
+
+
+START = pd.Timestamp('2010-01-01')
+END = pd.Timestamp('2019-04-09')
+
+# Antaget datum för bytet från Carestream till Sectra RIS.
+SECTRA_START = pd.Timestamp('2015-01-01')
+
+CHUNK_ROWS = 1000000
+
+# Andel remisser per selektion i selections/, resten är granskningar och annat.
+MODALITY_MIX = {'rtg': 0.38, 'dt': 0.25, 'ul': 0.17, 'mr': 0.08, 'nm': 0.03, 'angio': 0.02, 'glys': 0.03,
+                'annat': 0.04}
+
+# Används när selections/ saknas.
+VOCABULARY = {
+    'rtg': ['Rtg thorax', 'Lungor', 'rtg hö fotled', 'Rtg vä handled', 'Höft bilateralt', 'Rtg buköversikt',
+            'Slätröntgen hö knä', 'rtg pulm och ventrikel', 'Halsrygg', 'Bäcken'],
+    'dt': ['DT hjärna', 'CT buk', 'DT thorax-buk', 'Trauma-DT', 'DT angio halskärl', 'CT urinvägar',
+           'DT lungartärer', 'DT ländrygg'],
+    'ul': ['Ulj buk', 'UL njurar', 'Ultraljud lever', 'DVT hö ben', 'Ulj halskärl', 'UL hjärta'],
+    'mr': ['MR hjärna', 'MR ländrygg', 'MRT hö knä', 'MR bröstrygg'],
+    'nm': ['Lungscint', 'Skelettscint', 'Myokardscint'],
+    'angio': ['Angio ben', 'PTA hö ben', 'Embolisering'],
+    'glys': ['Esofaguspassage', 'Tunntarmspassage', 'Genomlysning magsäck'],
+    'annat': ['Remissgranskning', 'Konferens', 'Demo', 'EKG vila', 'Bildlagring', 'Sekundärremiss']
+}
+
+# Relativ volym per timme på dygnet och per veckodag (måndag först).
+HOUR_PROFILE = np.array([3, 2, 2, 2, 2, 3, 4, 7, 10, 12, 12, 12, 11, 11, 11, 10, 9, 8, 7, 6, 5, 5, 4, 3], dtype=float)
+WEEKDAY_PROFILE = np.array([1.1, 1.05, 1.05, 1.05, 1.0, 0.6, 0.55])
+YEARLY_GROWTH = 1.03
+
+ACUTE_SHARE = 0.3
+# Carestream: 'Normal' för icke akuta, någon av dessa för akuta remisser.
+ACUTE_PRIORITIES = (['Akut', 'Omgående', 'Förtur'], [0.7, 0.15, 0.15])
+UNANSWERED_SHARE = 0.01
+
+# Median och spridning (log) för svarstiden i timmar.
+ACUTE_TURNAROUND = (1.5, 1.0)
+ROUTINE_TURNAROUND = (30.0, 1.2)
+
+UNITS = {'A1': 'Akutmottagningen', 'B2': 'Kirurgavdelning', 'C3': 'Medicinavdelning', 'D4': 'Ortopedmottagning',
+         'E5': 'Vårdcentral'}
+SECTIONS = {'rtg': 'Skelett', 'dt': 'DT', 'ul': 'Ultraljud', 'mr': 'MR', 'nm': 'Nuklear', 'angio': 'Kärl',
+            'glys': 'Genomlysning', 'annat': 'Administration'}
+
+
+def vocabulary(selections_dir: str = 'selections') -> Dict[str, List[str]]:
+    """Return the strings per selection in selections_dir, or the built-in vocabulary if there are none"""
+    words = {}
+    for path in sorted(glob.glob(os.path.join(selections_dir, '*.txt'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding='utf-8') as f:
+            strings = [s for s in (line.rstrip('\n') for line in f) if s.strip()]
+        if name in MODALITY_MIX and strings:
+            words[name] = strings
+    return {name: words.get(name, VOCABULARY[name]) for name in MODALITY_MIX}
+
+
+def _mutate(s: str, rng: random.Random) -> str:
+    """A typo or an extra word, as in the free text of the real dump"""
+    kind = rng.randrange(4)
+    if kind == 0 and len(s) > 3:
+        i = rng.randrange(len(s) - 1)
+        return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+    if kind == 1:
+        return s.lower()
+    if kind == 2:
+        return s + rng.choice([' ?', ' akut', ' hö', ' vä', ' inkl kontrast', ' jmf tidigare'])
+    return s + ' ' + str(rng.randrange(100000))
+
+
+class Generator:
+    """Draws chunks of synthetic dump rows. Chunks are independent given the seed and the chunk number."""
+
+    def __init__(self, seed: int = 0, start: pd.Timestamp = START, end: pd.Timestamp = END,
+                 selections_dir: str = 'selections'):
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.modalities = list(MODALITY_MIX)
+        self.mix = np.array([MODALITY_MIX[m] for m in self.modalities])
+        self.mix /= self.mix.sum()
+        # Zipf inom varje modalitet, över strängarna i en slumpad ordning.
+        self.strings, self.weights = [], []
+        for name, strings in vocabulary(selections_dir).items():
+            strings = np.array(strings, dtype=object)[rng.permutation(len(strings))]
+            w = 1.0 / np.arange(1, len(strings) + 1) ** 1.1
+            self.strings.append(strings)
+            self.weights.append(w / w.sum())
+
+        self.days = pd.date_range(start.normalize(), end.normalize(), freq='D')
+        years = (self.days - self.days[0]).days.to_numpy() / 365.25
+        p = YEARLY_GROWTH ** years * WEEKDAY_PROFILE[self.days.weekday]
+        self.day_p = p / p.sum()
+        self.hour_p = HOUR_PROFILE / HOUR_PROFILE.sum()
+
+    def chunk(self, number: int, rows: int, first_uid: int) -> DataFrame:
+        rng = np.random.default_rng([self.seed, number])
+        day = self.days.to_numpy()[rng.choice(len(self.days), size=rows, p=self.day_p)]
+        seconds = rng.choice(24, size=rows, p=self.hour_p) * 3600 + rng.integers(0, 3600, rows)
+        bestallning = day + seconds.astype('timedelta64[s]')
+
+        modality = rng.choice(len(self.modalities), size=rows, p=self.mix)
+        undersokning = np.empty(rows, dtype=object)
+        for i, (strings, weights) in enumerate(zip(self.strings, self.weights)):
+            at = np.flatnonzero(modality == i)
+            undersokning[at] = strings[rng.choice(len(strings), size=len(at), p=weights)]
+        text_rng = random.Random(self.seed * 1000003 + number)
+        for i in np.flatnonzero(rng.random(rows) < 0.02):
+            undersokning[i] = _mutate(undersokning[i], text_rng)
+
+        acute = rng.random(rows) < ACUTE_SHARE
+        sectra = bestallning >= SECTRA_START.to_datetime64()
+        priorities, p = ACUTE_PRIORITIES
+        prioritet = np.full(rows, 'Normal', dtype=object)
+        prioritet[acute] = np.array(priorities, dtype=object)[rng.choice(len(p), size=int(acute.sum()), p=p)]
+        prioritet[sectra] = None
+        akut = np.where(sectra, acute.astype(float), np.nan)
+
+        median, sigma = np.where(acute[:, None], ACUTE_TURNAROUND, ROUTINE_TURNAROUND).T
+        seconds = median * 3600 * np.exp(sigma * rng.standard_normal(rows))
+        svar = bestallning + seconds.astype('int64').astype('timedelta64[s]')
+        examined = seconds * rng.uniform(0.2, 0.8, rows)
+        undersokningstid = bestallning + examined.astype('int64').astype('timedelta64[s]')
+        unanswered = rng.random(rows) < UNANSWERED_SHARE
+        svar[unanswered] = np.datetime64('NaT')
+
+        unit = rng.choice(list(UNITS), size=rows, p=[0.4, 0.2, 0.2, 0.1, 0.1])
+        df = DataFrame({
+            'bestallning_uid': np.arange(first_uid, first_uid + rows).astype(str),
+            'bestallningstidpunkt': bestallning,
+            'remiss_datum': day.astype('datetime64[D]').astype(str),
+            'remiss_tid': bestallning,
+            'prioritet': prioritet,
+            'akut': akut,
+            'bestalld_från_vårdenhet_id': unit,
+            'vardenhet_namn': pd.Series(unit).map(UNITS).to_numpy(),
+            'undersokningstid': undersokningstid,
+            'undersokning': undersokning,
+            'till_sektion': np.array([SECTIONS[m] for m in self.modalities], dtype=object)[modality],
+            'lab_kombikakod': 'RTG',
+            'lab_vardenhet': 'Huddinge',
+            'svarstyp': np.where(unanswered, None, 'Slutsvar'),
+            'svar_mottogs': svar
+        })
+        return df[list(DTYPES)]
+
+    def chunks(self, rows: int, chunk_rows: int = CHUNK_ROWS) -> Iterator[DataFrame]:
+        for number, first in enumerate(range(0, rows, chunk_rows)):
+            yield self.chunk(number, min(chunk_rows, rows - first), first)
+
+
+def write_dump(path: str, rows: int, seed: int = 0, chunk_rows: int = CHUNK_ROWS, **kwargs) -> str:
+    """Write a synthetic dump with the given number of rows to path (pipe separated, like the real dump)"""
+    generator = Generator(seed, **kwargs)
+    for i, chunk in enumerate(generator.chunks(rows, chunk_rows)):
+        chunk.to_csv(path, sep='|', index=False, header=i == 0, mode='w' if i == 0 else 'a',
+                     date_format='%Y-%m-%d %H:%M:%S')
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dump', help='CSV-fil som skrivs')
+    parser.add_argument('--rows', type=int, default=100000, help='antal rader (standard 100000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--selections', default='selections', help='katalog med strängar per modalitet')
+    args = parser.parse_args()
+    write_dump(args.dump, args.rows, args.seed, selections_dir=args.selections)
+    print('Skrev {} rader till {}'.format(args.rows, args.dump))
@@ -0,0 +1,12 @@
+"""Acute radiology referrals at Huddinge: volumes per period and modality, and turnaround times.
+
+Run the whole analysis with ``python -m remissfl``, or use the stages directly:
+
+    from remissfl import Analysis
+    analysis = Analysis('rtg_huddinge_2010-2019.csv')
+    analysis.table('jour_svarade')
+"""
+
+from .pipeline import Analysis, TABLES
+
+__all__ = ['Analysis', 'TABLES']
@@ -0,0 +1,183 @@
+"""Kör analysen: python -m remissfl [dump] [--from DATUM] [--to DATUM] [--modaliteter DT Rtg ...] [--outputs ...]
+
+Utan argument skrivs allt som förut: sammanfattning, selektioner, arbetsböcker och figurer för hela dump. Endast de
+steg som de valda utdata behöver beräknas (se pipeline.py), t.ex. skriver
+
+    python -m remissfl --from 2019-01-01 --to 2019-03-31 --modaliteter DT --outputs sen_jour_svarade
+
+ut akuta DT-remisser besvarade 00.00 - 07.30 första kvartalet 2019 utan att rita något.
+"""
+
+import os
+import argparse
+import datetime
+from .coverage import percent_covered
+from .features import days, months
+from .modality import MODALITIES
+from .pipeline import Analysis, TABLES, MODALITETER
+from .instrument import read_records, regressions
+from .shards import SHARDS
+from .fuzzy import MIN_CONFIDENCE
+
+
+# Utdata som kan väljas utöver tabellnamnen i TABLES, i den ordning de skrivs. Köerna (backlog.py) skrivs endast
+# om de väljs.
+OUTPUTS = ('summary', 'selections', 'xlsx', 'figures', 'backlog')
+DEFAULT_OUTPUTS = ('summary', 'selections', 'xlsx', 'figures')
+
+
+def summary(analysis: Analysis, top_n: int = 500, most_common: int = 10000):
+    # Modalitet finns inte som separat variabel i TC. Vi behöver gissa modalitet baserat på "undersokning" kolumnen
+    # vilken är fritext. Det är nästan omöjligt att sortera alla rätt, små fel kommer att finnas men vi behöver veta
+    # att viktiga texter (som upprepas i hundratals remisser t.ex) inte hamnar fel.
+    print('\nLaddat DataFrame med {} rader och {} kolumner.'.format(*analysis.dump_shape))
+    print(
+        '\nDet finns {} unika värden i "undersokning" kolumn. De {} mest frekventa representerar {:.1f}% av hela '
+        'summan.'.format(len(analysis.undersokning_counts), top_n, percent_covered(analysis.coverage, top_n))
+    )
+
+    # Har vi missat viktiga strängar? missed är sorterad med flest remisser först.
+    print('\nTestar om vi har missat frekventa strängar i de {} vanligaste (dessa täcker {:.2f}% av alla värden).'
+          .format(most_common, percent_covered(analysis.coverage, most_common)))
+    missed = analysis.missed(most_common)
+    if len(missed):
+        print('\nTotalt missade: {}/{} (i {} remisser)\nViktigast: "{}" med {} counts'
+              .format(len(missed), most_common, int(missed.antal.sum()), missed.undersokning.iloc[0],
+                      missed.antal.iloc[0]))
+    else:
+        print('\nInga missade strängar bland de {} vanligaste.'.format(most_common))
+
+    # Strängar som endast nyckelordsindexet klassar. De med lägst konfidens bör granskas.
+    found = analysis.keyword_matches(most_common)
+    if len(found):
+        unsure = found[found.konfidens < MIN_CONFIDENCE]
+        print('\n{} strängar (i {} remisser) klassades med nyckelord, {} med konfidens under {} blev kvar som Rtg.'
+              .format(len(found) - len(unsure), int(found.antal.sum() - unsure.antal.sum()), len(unsure),
+                      MIN_CONFIDENCE))
+        for row in found.head(5).itertuples(index=False):
+            print('  {:.2f} "{}" ({}, {} remisser)'.format(row.konfidens, row.undersokning, row.modalitet, row.antal))
+
+    if not analysis.years:
+        print('\nInga akuta remisser besvarades i perioden.')
+        return
+
+    def busiest(name: str, columns: list) -> list:
+        t = analysis.table(name)
+        return t.loc[t.antal == t.antal.max(), columns].values.tolist()[0]
+
+    year, month, n = busiest('_b_dag_by_month_and_day', ['year', 'month', 'antal'])
+    print('\nMest belastad månad dagtid var {} {} med {} akuta remisser besvarade 07:30 - 16:00'
+          .format(months[int(month)], year, n))
+
+    year, month, n = busiest('_b_jour_by_month_and_day', ['year', 'month', 'antal'])
+    print('\nMest belastad månad jourtid var {} {} med {} akuta remisser besvarade 16:00 - 07:30'
+          .format(months[int(month)], year, n))
+
+    year, month, day, n = busiest('_b_dag_by_month_and_day', ['year', 'month', 'day', 'antal'])
+    print('\nMest belastad dag var {} {}/{} {} med {} akuta remisser besvarade 07:30 - 16:00'
+          .format(days[datetime.datetime(year, month, day).weekday()], day, month, year, n))
+
+    year, month, day, n = busiest('_b_jour_by_month_and_day', ['year', 'month', 'day', 'antal'])
+    print('\nMest belastad jour var {} {}/{} {} med {} akuta remisser besvarade 16:00 - 07:30'
+          .format(days[datetime.datetime(year, month, day).weekday()], day, month, year, n))
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='python -m remissfl', description='Remissflöde för akuta remisser.')
+    parser.add_argument('dump', nargs='?', default='rtg_huddinge_2010-2019.csv', help='RIS-dump (CSV)')
+    parser.add_argument('--work-dir', default='.', help='katalog för selections/, xlsx/ och figures/ (standard .)')
+    parser.add_argument('--from', dest='start', type=datetime.date.fromisoformat,
+                        help='första datum (ÅÅÅÅ-MM-DD) som tas med')
+    parser.add_argument('--to', dest='end', type=datetime.date.fromisoformat,
+                        help='sista datum (ÅÅÅÅ-MM-DD) som tas med')
+    parser.add_argument('--modaliteter', nargs='+', default=MODALITETER, choices=MODALITIES, metavar='MODALITET',
+                        help='modaliteter i tabellerna per modalitet (standard {})'.format(' '.join(MODALITETER)))
+    parser.add_argument('--outputs', nargs='+', default=list(DEFAULT_OUTPUTS), choices=OUTPUTS + tuple(TABLES),
+                        metavar='UTDATA', help='{} eller namn på tabeller som skrivs ut (standard {})'
+                        .format(', '.join(OUTPUTS), ' '.join(DEFAULT_OUTPUTS)))
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='antal processer som ritar figurer och räknar delar parallellt (standard en per kärna)')
+    # Kuberna och svarstiderna räknas per del i en process per kärna och slås ihop till hela analysen. För varje del
+    # skrivs dessutom arbetsböcker, köer och valda tabeller under <work-dir>/<indelning>/<del>/.
+    parser.add_argument('--shards', default=None, choices=list(SHARDS),
+                        help='dela upp remisserna per sjukhus (site), beställande enhet (unit) eller år (year)')
+    # Endast räkningarna per del behålls, så minnet begränsas av antal rader per del och inte av storleken på dump.
+    # Svarstider per remiss (tid_deltas, boxplots) och köer kräver raderna och skrivs inte.
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='läs dump i delar om så många rader (för dumpar som inte ryms i minnet)')
+    parser.add_argument('--modality-cache', default=None,
+                        help='SQLite-cache för klassade strängar (standard <work-dir>/modality_cache.sqlite)')
+    # Om satt läggs endast rader i dump som är nyare än de redan inlästa till, och alla räknetabeller tas från de
+    # sparade räkningarna. Tidsdeltas och täckning av strängar beräknas fortfarande från raderna i dump (täckningen
+    # i delar med --chunksize).
+    parser.add_argument('--aggregates', default=None,
+                        help='SQLite-fil med sparade räkningar per dag (se incremental.py)')
+    # Median, p90 och p95 för svarstiden uppskattas ur histogram per dag som kan slås ihop mellan körningar och
+    # sjukhus (se turnaround.py).
+    parser.add_argument('--delta-sketches', action='store_true',
+                        help='skriv även kvantiler för svarstiden per år, månad och veckodag')
+    parser.add_argument('--report', default=None,
+                        help='skriv tid, minne och rader per steg som JSON, eller lägg till som JSON-rader (.jsonl) '
+                             'och varna för steg som är långsammare än tidigare körningar')
+    parser.add_argument('--profile', default=None, help='skriv tiden per steg som foldade stackar för flame graphs')
+    parser.add_argument('--verbose', action='store_true', help='skriv ut varje steg när det är klart')
+    args = parser.parse_args(argv)
+    if args.chunksize is not None and args.shards is not None:
+        parser.error('--chunksize och --shards kan inte kombineras')
+    if args.chunksize is not None and 'backlog' in args.outputs:
+        parser.error('köerna (backlog) kräver raderna och kan inte räknas med --chunksize')
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    modality_cache = args.modality_cache or os.path.join(args.work_dir, 'modality_cache.sqlite')
+    analysis = Analysis(args.dump, args.work_dir, modality_cache=modality_cache, aggregates=args.aggregates,
+                        delta_sketches=args.delta_sketches, start=args.start, end=args.end,
+                        modalities=args.modaliteter, shard_by=args.shards, processes=args.jobs,
+                        chunksize=args.chunksize)
+    analysis.report.echo = args.verbose
+
+    print('Läser data från {}...'.format(args.dump))
+    if args.aggregates is not None:
+        print('\nLäste in {} nya akuta remisser till {}.'.format(analysis.ingested, args.aggregates))
+
+    for output in args.outputs:
+        if output in TABLES:
+            print('\n{}:\n{}'.format(output, analysis.table(output).to_string(index=False)))
+    if 'summary' in args.outputs:
+        summary(analysis)
+    if 'selections' in args.outputs:
+        analysis.write_selections()
+    if 'xlsx' in args.outputs:
+        analysis.write_workbooks()
+    if 'figures' in args.outputs:
+        print('\nPlotting results...')
+        n = analysis.render_figures(args.jobs)
+        print('\nRitade {} av {} figurer (övriga oförändrade).'.format(n, len(analysis.figures)))
+    if 'backlog' in args.outputs:
+        analysis.write_backlog()
+
+    if args.shards is not None:
+        for key in analysis.shards:
+            part = analysis.shard(key)
+            with analysis.report.span('shard', shard=key):
+                for output in args.outputs:
+                    if output in TABLES:
+                        print('\n{} {}:\n{}'.format(output, key, part.table(output).to_string(index=False)))
+                if 'xlsx' in args.outputs:
+                    part.write_workbooks()
+                if 'backlog' in args.outputs:
+                    part.write_backlog()
+        print('\nSkrev utdata för {} delar under {}.'.format(len(analysis.shards),
+                                                           os.path.join(args.work_dir, args.shards)))
+
+    if args.report:
+        slow = regressions(analysis.report, read_records(args.report)) if args.report.endswith('.jsonl') else []
+        analysis.report.write(args.report)
+        for name, seconds, usual in slow:
+            print('\nVARNING: {} tog {:.1f} s, median för tidigare körningar är {:.1f} s.'
+                  .format(name, seconds, usual))
+    if args.profile:
+        analysis.report.write_folded(args.profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Open referrals over time: queue depth, arrival and answer rates, and peak backlog.
+
+Every answered referral is an arrival at bestallningstidpunkt and a departure at svar_mottogs. With both arrays
+sorted once (O(n log n)), the number of open referrals at any time t is the number of arrivals up to t minus the
+number of answers up to t, two binary searches. The same searches at t and t - window give the arrivals and answers
+within a sliding window. Depth and rates are evaluated on a regular grid of times (default every minute), so no
+per-row loop is needed and the cost is O((n + m) log n) for n referrals and m grid points.
+
+Referrals without an answer are left out: they would otherwise stay open until the end of the dump. A referral
+answered before it was ordered (clock errors) counts as answered at its order time.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from typing import NamedTuple, Sequence
+
+from .features import interval_codes, INTERVAL_BOUNDARIES
+from .turnaround import turnaround_ns
+
+
+class Events(NamedTuple):
+    arrivals: np.ndarray  # bestallningstidpunkt i ns, sorterade
+    answers: np.ndarray  # svar_mottogs i ns, sorterade
+
+
+def events(df: DataFrame) -> Events:
+    """Return the sorted arrival and answer times of the answered referrals in df"""
+    ns, present = turnaround_ns(df)
+    start = df['bestallningstidpunkt'].to_numpy(dtype='datetime64[ns]').view('int64')[present]
+    end = start + np.maximum(ns[present], 0)
+    return Events(np.sort(start), np.sort(end))
+
+
+def time_grid(ev: Events, step: str = '1min', start: pd.Timestamp = None, end: pd.Timestamp = None) -> np.ndarray:
+    """Return grid times in ns every step from start (default the first arrival) to end (default the last answer)"""
+    step_ns = pd.Timedelta(step).value
+    first = pd.Timestamp(start).value if start is not None else int(ev.arrivals[0]) if len(ev.arrivals) else 0
+    last = pd.Timestamp(end).value if end is not None else int(ev.answers[-1]) if len(ev.answers) else first
+    first -= first % step_ns
+    return np.arange(first, last + 1, step_ns, dtype='int64')
+
+
+def open_depth(ev: Events, grid: np.ndarray) -> np.ndarray:
+    """The number of referrals ordered but not yet answered at each grid time"""
+    return np.searchsorted(ev.arrivals, grid, side='right') - np.searchsorted(ev.answers, grid, side='right')
+
+
+def _in_window(times: np.ndarray, grid: np.ndarray, window_ns: int) -> np.ndarray:
+    return np.searchsorted(times, grid, side='right') - np.searchsorted(times, grid - window_ns, side='right')
+
+
+def queue(df: DataFrame, step: str = '1min', window: str = '60min', start: pd.Timestamp = None,
+          end: pd.Timestamp = None) -> DataFrame:
+    """Return the open referrals at every grid time and the arrival and answer rates per hour over the window before.
+
+    The frame is indexed by the grid times and has the columns öppna, ankomster_per_timme and svar_per_timme.
+    """
+    ev = events(df)
+    grid = time_grid(ev, step, start, end)
+    window_ns = pd.Timedelta(window).value
+    per_hour = pd.Timedelta('1h').value / window_ns
+    return DataFrame({
+        'öppna': open_depth(ev, grid),
+        'ankomster_per_timme': _in_window(ev.arrivals, grid, window_ns) * per_hour,
+        'svar_per_timme': _in_window(ev.answers, grid, window_ns) * per_hour
+    }, index=pd.DatetimeIndex(grid.view('datetime64[ns]'), name='tid'))
+
+
+def peak_backlog(df: DataFrame, by: Sequence[str] = ('modalitet', 'interval'), step: str = '1min',
+                 start: pd.Timestamp = None, end: pd.Timestamp = None,
+                 boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> DataFrame:
+    """Return the peak and mean number of open referrals and when the peak occurred.
+
+    by may contain 'modalitet' (a separate queue per modality, plus 'Alla' for all referrals together), 'interval'
+    (the interval of the day of the grid time, coded like interval_skapad) and 'year'. Grid times with no open
+    referrals count towards the mean, and the earliest time is given when the peak occurs more than once.
+    """
+    grid = time_grid(events(df), step, start, end)
+    if len(grid) == 0:
+        # Tomt rutnät, t.ex. start efter end: inga köer att räkna.
+        return DataFrame(columns=list(by) + ['max_öppna', 'tidpunkt', 'medel_öppna'])
+    times = Series(grid.view('datetime64[ns]'))
+    attributes = {'interval': lambda: interval_codes(times, boundaries).astype('int8'),
+                  'year': lambda: times.dt.year.to_numpy()}
+    keys = DataFrame({name: attributes[name]() for name in by if name != 'modalitet'}, index=times.index)
+
+    # Rutnätstiderna grupperas en gång; inom varje grupp ligger tiderna i stigande ordning.
+    if len(keys.columns):
+        g = keys.groupby(list(keys.columns), sort=True)
+        codes = g.ngroup().to_numpy()
+        groups = g.size().index.to_frame(index=False)
+    else:
+        codes = np.zeros(len(grid), dtype='int64')
+        groups = DataFrame(index=[0])
+    order = np.argsort(codes, kind='stable')
+    n = np.bincount(codes, minlength=len(groups))
+    starts = np.concatenate([[0], np.cumsum(n)[:-1]])
+    sorted_grid = grid[order]
+
+    modalities = [('Alla', df)]
+    if 'modalitet' in by:
+        modalitet = np.asarray(df['modalitet'], dtype=object)
+        modalities += [(m, df[modalitet == m]) for m in sorted(set(modalitet))]
+
+    parts = []
+    for name, rows in modalities:
+        depth = open_depth(events(rows), grid)[order]
+        peak = np.maximum.reduceat(depth, starts)
+        # Första (tidigaste) tiden i varje grupp där djupet är maximalt.
+        hits = np.flatnonzero(depth == np.repeat(peak, n))
+        first = hits[np.searchsorted(hits, starts)]
+        part = groups.assign(max_öppna=peak, tidpunkt=sorted_grid[first].view('datetime64[ns]'),
+                             medel_öppna=np.add.reduceat(depth, starts) / n)
+        parts.append(part.assign(modalitet=name) if 'modalitet' in by else part)
+    result = pd.concat(parts, ignore_index=True)
+    return result[list(by) + ['max_öppna', 'tidpunkt', 'medel_öppna']]
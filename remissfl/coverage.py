@@ -0,0 +1,105 @@
+"""How much of the referrals the selector regexes cover.
+
+The distinct 'undersokning' strings are sorted by their number of referrals once, and a cumulative sum over the
+sorted counts answers "how many referrals do the N most common strings cover" with a single lookup. Strings are
+matched against all selectors at once with one combined regex, so finding the frequent strings that no selector
+matches is one pass over the distinct strings. Strings that the keyword index of fuzzy.py classifies count as
+matched, and are listed with their confidence by keyword_matches for review.
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from typing import NamedTuple
+
+from .modality import SELECTORS
+from .fuzzy import match_keywords, MIN_CONFIDENCE
+
+
+# Selektorer som räknas som träff i täckningskontrollen. Alla matchas skiftlägesokänsligt, även exclude.
+COVERAGE_SELECTORS = ('exclude', 'glys_sel', 'angio_sel', 'ul_sel', 'dt_sel', 'mr_sel', 'nm_sel', 'granskning_sel',
+                      '_rtg_sel', '_glys_excl_sel')
+
+
+class Coverage(NamedTuple):
+    strings: np.ndarray  # distinkta strängar, flest remisser först
+    counts: np.ndarray  # antal remisser per sträng
+    cumulative: np.ndarray  # cumulative[i] = antal remisser för de i+1 vanligaste strängarna
+    total: int
+
+
+def string_counts(undersokning: Series) -> Series:
+    """Count the referrals per distinct string, most common first.
+
+    Strings with the same count keep the order they first appear in, like Counter.most_common. Missing values are
+    counted as one string.
+    """
+    codes, uniques = pd.factorize(undersokning, use_na_sentinel=False)
+    counts = np.bincount(codes, minlength=len(uniques))
+    order = np.argsort(-counts, kind='stable')
+    return Series(counts[order], index=pd.Index(np.asarray(uniques, dtype=object)[order], name='undersokning'),
+                  name='antal')
+
+
+def coverage(counts: Series) -> Coverage:
+    """Build the coverage of a Series of referral counts indexed by string, e.g. from string_counts"""
+    order = np.argsort(-counts.to_numpy(), kind='stable')
+    sorted_counts = counts.to_numpy(dtype='int64')[order]
+    cumulative = np.cumsum(sorted_counts)
+    return Coverage(np.asarray(counts.index, dtype=object)[order], sorted_counts, cumulative,
+                    int(cumulative[-1]) if len(cumulative) else 0)
+
+
+def covered(cov: Coverage, n: int) -> int:
+    """Return the number of referrals of the n most common strings"""
+    n = min(n, len(cov.cumulative))
+    return int(cov.cumulative[n - 1]) if n > 0 else 0
+
+
+def percent_covered(cov: Coverage, n: int) -> float:
+    """Return the percent of all referrals covered by the n most common strings, 0 if there are no referrals"""
+    if cov.total == 0:
+        return 0.0
+    return covered(cov, n) / cov.total * 100
+
+
+def combined_selector(selectors: dict = None, names=COVERAGE_SELECTORS) -> re.Pattern:
+    """Compile the named selectors into one case insensitive regex that matches if any of them does"""
+    selectors = SELECTORS if selectors is None else selectors
+    return re.compile('|'.join('(?:{})'.format(selectors[name]) for name in names), re.IGNORECASE)
+
+
+def matched(strings: np.ndarray, selectors: dict = None, keywords: bool = True) -> np.ndarray:
+    """Return True for every string that at least one coverage selector matches (False for missing values).
+
+    With keywords, strings that the keyword index classifies with enough confidence are matched as well.
+    """
+    rx = combined_selector(selectors)
+    hit = np.fromiter((isinstance(s, str) and rx.search(s) is not None for s in strings), dtype=bool,
+                      count=len(strings))
+    if keywords:
+        rest = np.flatnonzero(~hit)
+        hit[rest] = (match_keywords(strings[rest]).konfidens >= MIN_CONFIDENCE).to_numpy()
+    return hit
+
+
+def missed_strings(cov: Coverage, n: int = None, selectors: dict = None) -> DataFrame:
+    """Return the strings among the n most common (all if None) that no selector matches, ranked by the number of
+    referrals"""
+    strings = cov.strings if n is None else cov.strings[:n]
+    counts = cov.counts[:len(strings)]
+    hit = matched(strings, selectors)
+    return DataFrame({'undersokning': strings[~hit], 'antal': counts[~hit]})
+
+
+def keyword_matches(cov: Coverage, n: int = None, selectors: dict = None) -> DataFrame:
+    """Return the strings among the n most common (all if None) that no selector matches but the keyword index does,
+    with their number of referrals, keyword, modality and confidence, least confident first"""
+    strings = cov.strings if n is None else cov.strings[:n]
+    counts = cov.counts[:len(strings)]
+    rest = ~matched(strings, selectors, keywords=False)
+    found = match_keywords(strings[rest]).reset_index().assign(antal=counts[rest])
+    found = found[found.modalitet.notna()]
+    return found[['undersokning', 'antal', 'nyckelord', 'modalitet', 'konfidens']] \
+        .sort_values(['konfidens', 'antal'], ascending=[True, False], kind='mergesort').reset_index(drop=True)
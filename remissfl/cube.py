@@ -0,0 +1,224 @@
+"""Counts cube of acute referrals.
+
+The referrals are counted once into a dense array over (date, modalitet, interval_skapad, interval_svarad). Year,
+month, day and weekday are attributes of the date axis, so every count table in the analysis is a filter and a sum
+over the cube instead of a new scan over all rows. A cube is built for one timestamp column: 'svar_mottogs' for
+tables over answered referrals and 'bestallningstidpunkt' for tables over created ones.
+
+Cubes over different periods can be merged by adding them date by date, and a cube can be stored as its non-empty
+cells and rebuilt from them (see incremental.py).
+"""
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from typing import NamedTuple, Sequence
+
+from .features import calendar_columns, date_strings, INTERVAL_BOUNDARIES
+from .modality import CATEGORIES
+
+
+AXES = ('date', 'modalitet', 'interval_skapad', 'interval_svarad')
+
+# Attribut för datumaxeln som kan användas för gruppering och filtrering.
+DATE_ATTRIBUTES = ('year', 'month', 'day', 'weekday', 'date', 'datum')
+
+
+class Cube(NamedTuple):
+    counts: np.ndarray  # int64, en axel per namn i AXES
+    calendar: DataFrame  # en rad per datum med kolumnerna i DATE_ATTRIBUTES
+    modalities: tuple
+    intervals: np.ndarray  # intervallkoder, NaN först för saknat intervall
+
+
+def _interval_axis(codes: Series, n: int) -> np.ndarray:
+    codes = Series(codes).to_numpy(dtype=float, na_value=np.nan)
+    return np.where(np.isnan(codes), 0, codes).astype('int64').clip(0, n)
+
+
+def build_cube(df: DataFrame, timestamp: str, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> Cube:
+    """Count the rows of df into a cube over the dates of the given timestamp column.
+
+    df needs the columns 'modalitet', 'interval_skapad' and 'interval_svarad'. Rows with a missing timestamp are
+    left out, like they are by a groupby on the calendar columns.
+    """
+    days = df[timestamp].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    present = ~np.isnat(days)
+    dates, date_codes = np.unique(days[present], return_inverse=True)
+
+    modality_codes = pd.Categorical(df['modalitet'], categories=CATEGORIES).codes[present]
+    n = len(boundaries) + 1
+    skapad_codes = _interval_axis(df['interval_skapad'], n)[present]
+    svarad_codes = _interval_axis(df['interval_svarad'], n)[present]
+
+    shape = (len(dates), len(CATEGORIES), n + 1, n + 1)
+    flat = np.ravel_multi_index((date_codes.ravel(), modality_codes, skapad_codes, svarad_codes), shape)
+    counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+    return _cube(counts, dates)
+
+
+def _cube(counts: np.ndarray, dates: np.ndarray) -> Cube:
+    date_series = Series(dates.astype('datetime64[ns]'))
+    calendar = calendar_columns(date_series).assign(datum=date_strings(date_series))
+    intervals = np.concatenate([[np.nan], np.arange(1, counts.shape[2], dtype=float)])
+    return Cube(counts, calendar, CATEGORIES, intervals)
+
+
+def _dates(cube: Cube) -> np.ndarray:
+    return cube.calendar['datum'].to_numpy().astype('datetime64[D]')
+
+
+def cube_cells(cube: Cube) -> DataFrame:
+    """Return the non-empty cells of the cube as rows of (date, modalitet, interval_skapad, interval_svarad, antal).
+
+    date is yyyymmdd and the intervals are positions on the interval axis, 0 for a missing interval.
+    """
+    idx = np.nonzero(cube.counts)
+    return DataFrame({
+        'date': cube.calendar['date'].to_numpy(dtype='int64')[idx[0]],
+        'modalitet': np.asarray(cube.modalities, dtype=object)[idx[1]],
+        'interval_skapad': idx[2],
+        'interval_svarad': idx[3],
+        'antal': cube.counts[idx]
+    })
+
+
+def cube_from_cells(cells: DataFrame, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> Cube:
+    """Build a cube from rows as returned by cube_cells (rows for the same cell are added)"""
+    date = cells['date'].to_numpy(dtype='int64')
+    days = pd.to_datetime(date.astype(str), format='%Y%m%d').to_numpy().astype('datetime64[D]')
+    dates, date_codes = np.unique(days, return_inverse=True)
+    n = len(boundaries) + 1
+    shape = (len(dates), len(CATEGORIES), n + 1, n + 1)
+    modality_codes = pd.Categorical(cells['modalitet'], categories=CATEGORIES).codes
+    flat = np.ravel_multi_index((date_codes.ravel(), modality_codes, cells['interval_skapad'].to_numpy(),
+                                 cells['interval_svarad'].to_numpy()), shape)
+    counts = np.bincount(flat, weights=cells['antal'].to_numpy(), minlength=int(np.prod(shape)))
+    return _cube(counts.astype('int64').reshape(shape), dates)
+
+
+def merge_cubes(a: Cube, b: Cube) -> Cube:
+    """Add two cubes over the same modalities and intervals, e.g. from different periods of the dump"""
+    if a.counts.shape[1:] != b.counts.shape[1:]:
+        raise ValueError('Kuberna har olika modaliteter eller tidsintervall')
+    a_dates, b_dates = _dates(a), _dates(b)
+    dates = np.union1d(a_dates, b_dates)
+    counts = np.zeros((len(dates),) + a.counts.shape[1:], dtype='int64')
+    counts[np.searchsorted(dates, a_dates)] += a.counts
+    counts[np.searchsorted(dates, b_dates)] += b.counts
+    return _cube(counts, dates)
+
+
+def cube_window(cube: Cube, start: pd.Timestamp = None, end: pd.Timestamp = None) -> Cube:
+    """Return the part of the cube from the date of start through the date of end (None = no limit)"""
+    dates = _dates(cube)
+    keep = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        keep &= dates >= np.datetime64(pd.Timestamp(start).date())
+    if end is not None:
+        keep &= dates <= np.datetime64(pd.Timestamp(end).date())
+    return cube._replace(counts=cube.counts[keep], calendar=cube.calendar[keep].reset_index(drop=True))
+
+
+def covered_months(cube: Cube) -> tuple:
+    """Return the first and last month with data in the cube as (year, month) tuples, None if the cube is empty"""
+    if len(cube.calendar) == 0:
+        return None
+    months = cube.calendar['year'].to_numpy(dtype='int64') * 12 + cube.calendar['month'].to_numpy(dtype='int64') - 1
+    first, last = divmod(int(months.min()), 12), divmod(int(months.max()), 12)
+    return (first[0], first[1] + 1), (last[0], last[1] + 1)
+
+
+# Kolumner i kalendergrid och deras värden.
+GRID_COLUMNS = {'month': range(1, 13), 'weekday': range(7)}
+
+
+def calendar_grid(table: DataFrame, column: str, years: Sequence[int], covered: tuple = None) -> np.ma.MaskedArray:
+    """Spread a (year, column, antal) table over a dense years x column array, column being 'month' or 'weekday'.
+
+    Cells without referrals are 0. Given the covered period (first, last) as returned by covered_months, the cells
+    outside it are masked: the months before the first and after the last covered month, or for weekdays the years
+    without any covered month.
+    """
+    grid = pd.MultiIndex.from_product([list(years), GRID_COLUMNS[column]], names=['year', column])
+    values = table.set_index(['year', column])['antal'].reindex(grid, fill_value=0).to_numpy(dtype=float)
+    values = values.reshape(len(years), len(GRID_COLUMNS[column]))
+    if covered is None:
+        return np.ma.MaskedArray(values, mask=np.zeros(values.shape, dtype=bool))
+    (y0, m0), (y1, m1) = covered
+    year = np.asarray(years, dtype='int64')[:, None]
+    if column == 'month':
+        month_number = year * 12 + np.arange(12)
+        missing = (month_number < y0 * 12 + m0 - 1) | (month_number > y1 * 12 + m1 - 1)
+    else:
+        missing = np.broadcast_to((year < y0) | (year > y1), values.shape)
+    return np.ma.MaskedArray(values, mask=missing)
+
+
+def _labels(cube: Cube, axis: str) -> np.ndarray:
+    if axis == 'modalitet':
+        return np.asarray(cube.modalities, dtype=object)
+    return cube.intervals
+
+
+def cube_counts(cube: Cube, by: Sequence[str], **filters) -> DataFrame:
+    """Return the number of referrals per group like df.groupby(by).size().reset_index(name='antal').
+
+    by may contain the date attributes in DATE_ATTRIBUTES as well as 'modalitet', 'interval_skapad' and
+    'interval_svarad'. Keyword arguments restrict any of these to a list of allowed values, e.g.
+    interval_svarad=[3, 4, 5] or month=[1, 2, 3]. Groups with no referrals are left out, and referrals with a
+    missing interval only count in tables that are not grouped or filtered on that interval.
+    """
+    counts = cube.counts
+    date_mask = np.ones(len(cube.calendar), dtype=bool)
+    for name, values in filters.items():
+        if name in DATE_ATTRIBUTES:
+            date_mask &= cube.calendar[name].isin(values).to_numpy()
+        elif name in AXES:
+            axis = AXES.index(name)
+            counts = np.compress(np.isin(_labels(cube, name), values), counts, axis=axis)
+        else:
+            raise ValueError('Okänd dimension: {}'.format(name))
+
+    # Intervall som grupperas på men saknas ska inte räknas, precis som i groupby.
+    for name in ('interval_skapad', 'interval_svarad'):
+        if name in by and name not in filters:
+            counts = np.compress(~np.isnan(cube.intervals), counts, axis=AXES.index(name))
+
+    # Summera bort axlar som inte grupperas på.
+    kept = [a for a in AXES[1:] if a in by]
+    counts = counts[date_mask].sum(axis=tuple(AXES.index(a) for a in AXES[1:] if a not in kept))
+
+    # Slå ihop datum med samma värden på de datumattribut som grupperas på.
+    date_by = [b for b in by if b in DATE_ATTRIBUTES]
+    calendar = cube.calendar[date_mask]
+    if date_by:
+        g = calendar[date_by].reset_index(drop=True).groupby(date_by, sort=True)
+        grouped = np.zeros((g.ngroups,) + counts.shape[1:], dtype=counts.dtype)
+        np.add.at(grouped, g.ngroup().to_numpy(), counts)
+        groups = g.size().index.to_frame(index=False)
+    else:
+        groups = None
+        grouped = counts.sum(axis=0, keepdims=True)
+
+    # Ta fram etiketter för alla celler med remisser.
+    kept_labels = []
+    for a in kept:
+        labels = _labels(cube, a)
+        if a in filters:
+            labels = labels[np.isin(labels, filters[a])]
+        elif a.startswith('interval'):
+            labels = labels[~np.isnan(labels)]
+        kept_labels.append(labels)
+
+    nonzero = np.nonzero(grouped)
+    columns = {}
+    if groups is not None:
+        for b in date_by:
+            columns[b] = groups[b].to_numpy()[nonzero[0]]
+    for a, labels, idx in zip(kept, kept_labels, nonzero[1:]):
+        columns[a] = labels[idx]
+    columns['antal'] = grouped[nonzero]
+
+    table = DataFrame(columns, columns=list(by) + ['antal'])
+    return table.sort_values(list(by), kind='mergesort').reset_index(drop=True) if len(by) else table
@@ -0,0 +1,107 @@
+"""Export of result tables.
+
+Workbooks are written row by row with xlsxwriter in constant memory mode, so only the current row is held by the
+writer regardless of the length of the table. Next to every workbook the same table is written as a flat CSV file,
+and as Parquet when pyarrow is installed, for use in other programs.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import List
+
+import xlsxwriter
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+# Syskonfiler som skrivs bredvid varje arbetsbok.
+SIBLINGS = ('csv', 'parquet')
+
+# Antal rader som konverteras till Python-värden åt gången.
+CHUNK_ROWS = 10000
+
+
+def _index_names(table: DataFrame) -> list:
+    return ['' if n is None else str(n) for n in table.index.names]
+
+
+def _header_rows(table: DataFrame, n_index: int) -> List[list]:
+    columns = table.columns
+    if isinstance(columns, pd.MultiIndex):
+        rows = []
+        for level in range(columns.nlevels):
+            labels = [str(c) for c in columns.get_level_values(level)]
+            # Visa varje etikett i en övre nivå en gång, i gruppens första kolumn.
+            if level < columns.nlevels - 1:
+                labels = [l if i == 0 or l != labels[i - 1] else None for i, l in enumerate(labels)]
+            rows.append([None] * n_index + labels)
+        rows[-1][:n_index] = _index_names(table)
+        return rows
+    return [_index_names(table)[:n_index] + [str(c) for c in columns]]
+
+
+def _cells(values: list) -> list:
+    return [None if isinstance(v, float) and np.isnan(v) else v for v in values]
+
+
+def write_xlsx(path: str, table: DataFrame, heading: str = None, index: bool = True):
+    """Write table to a workbook, one row at a time.
+
+    With index the index levels come first, one column each. A heading is written in the first cell and the table
+    starts on the fourth row, as in the workbooks written with to_excel(startrow=3).
+    """
+    n_index = table.index.nlevels if index else 0
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        sheet = workbook.add_worksheet('Sheet1')
+        bold = workbook.add_format({'bold': True})
+        row = 0
+        if heading is not None:
+            sheet.write_string(0, 0, heading)
+            row = 3
+        for labels in _header_rows(table, n_index):
+            sheet.write_row(row, 0, labels, bold)
+            row += 1
+
+        flat = table.reset_index() if index else table
+        for start in range(0, len(flat), CHUNK_ROWS):
+            chunk = flat.iloc[start:start + CHUNK_ROWS]
+            columns = [chunk.iloc[:, i].tolist() for i in range(chunk.shape[1])]
+            for values in zip(*columns):
+                sheet.write_row(row, 0, _cells(values))
+                row += 1
+    finally:
+        workbook.close()
+
+
+def flat_table(table: DataFrame, index: bool = True) -> DataFrame:
+    """Return table with the index as ordinary columns and column levels joined with '_'"""
+    flat = table.copy(deep=False)
+    if isinstance(flat.columns, pd.MultiIndex):
+        flat.columns = ['_'.join(str(c) for c in labels) for labels in flat.columns]
+    return flat.reset_index() if index else flat
+
+
+def write_siblings(path: str, table: DataFrame, index: bool = True, formats=SIBLINGS) -> List[str]:
+    """Write table as CSV (and Parquet if pyarrow is available) next to path, returning the written paths"""
+    base = os.path.splitext(path)[0]
+    flat = flat_table(table, index=index)
+    written = []
+    if 'csv' in formats:
+        flat.to_csv(base + '.csv', index=False)
+        written.append(base + '.csv')
+    if 'parquet' in formats and pyarrow is not None:
+        flat.to_parquet(base + '.parquet', index=False)
+        written.append(base + '.parquet')
+    return written
+
+
+def export_table(path: str, table: DataFrame, heading: str = None, index: bool = True) -> List[str]:
+    """Write table to the workbook at path and its machine readable siblings, returning the written paths"""
+    write_xlsx(path, table, heading=heading, index=index)
+    return [path] + write_siblings(path, table, index=index)
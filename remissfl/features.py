@@ -0,0 +1,105 @@
+"""Derived columns computed from the timestamp columns.
+
+Calendar columns (year, month, day, weekday and a yyyymmdd date key) are derived from a datetime64 column in one
+vectorized pass and stored as small integers. The same stage is used for 'svar_mottogs' and 'bestallningstidpunkt'.
+
+Time of day intervals are computed from nanosecond-of-day offsets with a binary search over the interval
+boundaries. The boundaries default to 07:30, 12:00, 16:00 and 20:00 and can be overridden with the
+REMISSFL_INTERVALS environment variable, e.g. REMISSFL_INTERVALS=07:30,12:00,16:00,21:00. There are always four
+boundaries, since the day and on-call intervals of the tables (pipeline.DAG, JOUR and SEN_JOUR) are codes 1-2, 3-5
+and 5.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from typing import Sequence
+
+
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+CALENDAR_COLUMNS = ('year', 'month', 'day', 'weekday', 'date')
+
+# Namn på veckodagar (weekday 0 - 6) och månader i tabeller, figurer och sammanfattning.
+days = ('Mån', 'Tis', 'Ons', 'Tor', 'Fre', 'Lör', 'Sön')
+months = ('Jan', 'Feb', 'Mar', 'Apr', 'Maj', 'Jun', 'Jul', 'Aug', 'Sep', 'Okt', 'Nov', 'Dec')
+
+
+# Dagtid är intervall 1 - 2 (första till tredje gränsen), jour 3 - 5 och sen jour 5 (00:00 till första gränsen).
+N_BOUNDARIES = 4
+
+
+def check_boundaries(minutes: Sequence[int]) -> tuple:
+    """Return the boundaries as a tuple, or raise ValueError unless they are N_BOUNDARIES increasing minutes after
+    midnight"""
+    minutes = [int(m) for m in minutes]
+    if len(minutes) != N_BOUNDARIES or minutes != sorted(set(minutes)) or not 0 < minutes[0] \
+            or not minutes[-1] < 24 * 60:
+        raise ValueError('Intervallgränser måste vara {} stigande tider efter 00:00: {}'
+                         .format(N_BOUNDARIES, ','.join('{:02d}:{:02d}'.format(*divmod(m, 60)) for m in minutes)))
+    return tuple(minutes)
+
+
+def parse_boundaries(spec: str) -> tuple:
+    """Parse comma separated 'HH:MM' boundaries into sorted minutes after midnight"""
+    minutes = []
+    for part in spec.split(','):
+        h, m = part.strip().split(':')
+        minutes.append(int(h) * 60 + int(m))
+    return check_boundaries(minutes)
+
+
+# Intervall i är [gräns i, gräns i+1) för i = 1..4, och intervall 5 är 00:00 till första gränsen.
+INTERVAL_BOUNDARIES = parse_boundaries(os.environ.get('REMISSFL_INTERVALS', '07:30,12:00,16:00,20:00'))
+
+
+def interval_codes(ts: Series, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> np.ndarray:
+    """Return the interval code (1..n+1) for every timestamp, NaN for missing timestamps.
+
+    boundaries are minutes after midnight as returned by parse_boundaries. With the default boundaries the
+    codes are 1 = 07:30-12:00, 2 = 12:00-16:00, 3 = 16:00-20:00, 4 = 20:00-00:00 and 5 = 00:00-07:30.
+    """
+    ns = ts.to_numpy(dtype='datetime64[ns]').view('int64')
+    missing = ns == np.iinfo('int64').min  # NaT
+    bounds = np.asarray(boundaries, dtype='int64') * NS_PER_MINUTE
+    idx = np.searchsorted(bounds, ns % NS_PER_DAY, side='right')
+    codes = np.where(idx == 0, len(bounds) + 1, idx).astype(float)
+    codes[missing] = np.nan
+    return codes
+
+
+def calendar_columns(ts: Series, suffix: str = '') -> DataFrame:
+    """Return year, month (1-12), day, weekday (0 = måndag) and date (yyyymmdd) columns for a timestamp column.
+
+    Column names get the given suffix, e.g. '_skapad'. Missing timestamps give missing values, in which case the
+    columns use pandas nullable integer dtypes instead of plain numpy ones.
+    """
+    d = ts.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    missing = np.isnat(d)
+    months = d.astype('datetime64[M]').astype('int64')
+    year = months // 12 + 1970
+    month = months % 12 + 1
+    day = (d - d.astype('datetime64[M]')).astype('int64') + 1
+    weekday = (d.astype('int64') + 3) % 7  # 1970-01-01 var en torsdag
+    date = year * 10000 + month * 100 + day
+
+    columns = {}
+    for name, values, dtype in zip(CALENDAR_COLUMNS, [year, month, day, weekday, date],
+                                   ['int16', 'int8', 'int8', 'int8', 'int32']):
+        values = values.astype(dtype)
+        if missing.any():
+            values = pd.arrays.IntegerArray(np.where(missing, 0, values).astype(dtype), missing)
+        columns[name + suffix] = values
+    return DataFrame(columns, index=ts.index)
+
+
+def calendar_renames(suffix: str) -> dict:
+    """Return a column mapping from suffixed calendar columns to the plain names"""
+    return {name + suffix: name for name in CALENDAR_COLUMNS}
+
+
+def date_strings(ts: Series) -> np.ndarray:
+    """Format timestamps as 'YYYY-MM-DD' strings ('NaT' for missing values)"""
+    return np.datetime_as_string(ts.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]'), unit='D')
@@ -0,0 +1,134 @@
+"""Typo tolerant matching of 'undersokning' strings against canonical modality keywords.
+
+The selector regexes list misspellings one by one ('utraljud', 'ultrajlud', 'Ultarljud', ...). Here each modality
+instead has a few canonical keywords, and a word of a string matches a keyword if some part of the word is within a
+small edit distance of it (insertions, deletions, substitutions and swapped neighbouring letters), which also covers
+compounds such as 'bukultarljud'. A character trigram index over the keywords picks the candidates: only keywords
+sharing enough trigrams with a word, as many as the allowed number of edits leaves intact, are compared letter by
+letter. Words repeat a lot between strings and are matched once per call.
+
+Every matched string gets the modality of its best keyword and a confidence: 1 for an exact keyword, lower for every
+edit, minus the score of the best keyword of another modality, so strings naming two modalities get a low confidence
+and can be reviewed.
+"""
+
+import re
+import numpy as np
+from pandas import DataFrame, Index
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+
+# Modalitet -> kanoniska nyckelord, gemener. Korta förkortningar (DT, MR, UL) matchas endast av selektorerna.
+KEYWORDS = {
+    'DT': ('datortomografi',),
+    'MR': ('magnetkamera', 'magnetresonans'),
+    'NM': ('scintigrafi', 'renogram'),
+    'Angio': ('angiografi',),
+    'Ulj': ('ultraljud',),
+    'Glys': ('genomlysning', 'fluoroskopi'),
+    'Rtg': ('röntgen',)
+}
+
+# Lägsta konfidens för att en sträng ska klassas med nyckelorden.
+MIN_CONFIDENCE = 0.75
+
+Q = 3
+
+_WORD = re.compile(r'[^\W\d_]+')
+
+
+class KeywordIndex(NamedTuple):
+    keywords: tuple
+    modalities: tuple
+    postings: Dict[str, tuple]  # trigram -> index för nyckelorden som innehåller den
+    edits: np.ndarray  # högsta antal redigeringar per nyckelord
+    required: np.ndarray  # minsta antal gemensamma trigram för att ett nyckelord ska jämföras
+
+
+def _qgrams(s: str) -> set:
+    return {s[i:i + Q] for i in range(len(s) - Q + 1)}
+
+
+def max_edits(keyword: str, min_confidence: float = MIN_CONFIDENCE) -> int:
+    return int(len(keyword) * (1 - min_confidence) + 1e-9)
+
+
+def build_index(keywords: Dict[str, tuple] = KEYWORDS, min_confidence: float = MIN_CONFIDENCE) -> KeywordIndex:
+    """Index the trigrams of the keywords of every modality"""
+    pairs = [(word, modality) for modality, words in keywords.items() for word in words]
+    postings = {}
+    for i, (word, _) in enumerate(pairs):
+        for gram in _qgrams(word):
+            postings.setdefault(gram, []).append(i)
+    edits = np.asarray([max_edits(word, min_confidence) for word, _ in pairs])
+    # En redigering förstör högst Q trigram, ett byte av två grannbokstäver högst Q + 1.
+    required = np.maximum([len(_qgrams(word)) for word, _ in pairs] - (Q + 1) * edits, 1)
+    return KeywordIndex(tuple(w for w, _ in pairs), tuple(m for _, m in pairs),
+                        {gram: tuple(ids) for gram, ids in postings.items()}, edits, required)
+
+
+def substring_distance(keyword: str, word: str) -> int:
+    """The smallest edit distance between keyword and any part of word, counting a swap of two neighbouring letters
+    as one edit"""
+    previous, row = None, list(range(len(keyword) + 1))
+    for j in range(1, len(word) + 1):
+        current = [0] * (len(keyword) + 1)
+        for i in range(1, len(keyword) + 1):
+            cost = keyword[i - 1] != word[j - 1]
+            current[i] = min(row[i] + 1, current[i - 1] + 1, row[i - 1] + cost)
+            if previous is not None and i > 1 and keyword[i - 1] == word[j - 2] and keyword[i - 2] == word[j - 1]:
+                current[i] = min(current[i], previous[i - 2] + 1)
+        previous, row = row, current
+        best = row[-1] if j == 1 else min(best, row[-1])
+    return best if word else len(keyword)
+
+
+def _word_scores(index: KeywordIndex, word: str) -> Dict[str, Tuple[float, str]]:
+    shared = np.zeros(len(index.keywords), dtype='int64')
+    for gram in _qgrams(word):
+        for i in index.postings.get(gram, ()):
+            shared[i] += 1
+    scores = {}
+    for i in np.flatnonzero(shared >= index.required):
+        keyword = index.keywords[i]
+        distance = substring_distance(keyword, word)
+        if distance > index.edits[i]:
+            continue
+        score = 1 - distance / len(keyword)
+        if score > scores.get(index.modalities[i], (0.0, None))[0]:
+            scores[index.modalities[i]] = (score, keyword)
+    return scores
+
+
+def match_keywords(strings: Iterable[str], index: KeywordIndex = None) -> DataFrame:
+    """Match strings against the keyword index.
+
+    Returns a frame indexed by the strings with the best keyword, its modality and the confidence (see above).
+    Strings with no word within the allowed number of edits of a keyword get no modality and confidence 0.
+    """
+    index = KEYWORD_INDEX if index is None else index
+    strings = list(strings)
+    memo = {}
+    modalitet, nyckelord, konfidens = [], [], np.zeros(len(strings))
+    for n, s in enumerate(strings):
+        best = {}
+        for word in _WORD.findall(s.lower()) if isinstance(s, str) else ():
+            if word not in memo:
+                memo[word] = _word_scores(index, word) if len(word) >= Q else {}
+            for m, (score, keyword) in memo[word].items():
+                if score > best.get(m, (0.0, None))[0]:
+                    best[m] = (score, keyword)
+        ranked = sorted(best.items(), key=lambda item: -item[1][0])
+        if ranked:
+            m, (score, keyword) = ranked[0]
+            konfidens[n] = score - (ranked[1][1][0] if len(ranked) > 1 else 0.0)
+            modalitet.append(m)
+            nyckelord.append(keyword)
+        else:
+            modalitet.append(None)
+            nyckelord.append(None)
+    return DataFrame({'modalitet': modalitet, 'nyckelord': nyckelord, 'konfidens': konfidens},
+                     index=Index(strings, name='undersokning', dtype=object))
+
+
+KEYWORD_INDEX = build_index()
@@ -0,0 +1,195 @@
+"""Incremental ingest of new RIS extracts into stored count cubes.
+
+The cells of the answered and created cubes (see cube.py) are kept per day in a SQLite database, so the counts of a
+month are a range of rows. An ingest only looks at the rows of an extract that were ordered at or after the
+watermark, the latest 'bestallningstidpunkt' ingested so far. Rows whose 'bestallning_uid' has already been ingested
+are dropped, and the counts of the remaining acute referrals are added to the stored cells. A nightly refresh
+therefore costs time proportional to the new referrals rather than to the whole history.
+
+Acute referrals that had no answer when they were ingested are remembered. When a later extract has the answer,
+their old cells are subtracted and the answered row is counted instead.
+
+The store also keeps a turnaround time sketch (see turnaround.py), which is updated the same way.
+"""
+
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import Sequence, Tuple
+
+from .ingest import read_dump_chunks, merge_acute
+from .modality import assign_modality, selectors_hash
+from .features import interval_codes, INTERVAL_BOUNDARIES
+from .cube import Cube, build_cube, cube_cells, cube_from_cells
+from .turnaround import build_sketch, SKETCH_KEYS
+
+
+COLUMNS = ['bestallning_uid', 'prioritet', 'akut', 'undersokning', 'bestallningstidpunkt', 'svar_mottogs']
+
+CUBES = {'svarade': 'svar_mottogs', 'skapade': 'bestallningstidpunkt'}
+
+
+def _meta(boundaries: Sequence[int]) -> dict:
+    return {'selectors': selectors_hash(), 'boundaries': ','.join(str(b) for b in boundaries)}
+
+
+def _connect(store: str, boundaries: Sequence[int]) -> sqlite3.Connection:
+    con = sqlite3.connect(store)
+    con.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    con.execute('CREATE TABLE IF NOT EXISTS seen (uid TEXT PRIMARY KEY, answered INTEGER NOT NULL)')
+    con.execute('CREATE TABLE IF NOT EXISTS cells (cube TEXT, date INTEGER, modalitet TEXT, interval_skapad INTEGER, '
+                'interval_svarad INTEGER, antal INTEGER, '
+                'PRIMARY KEY (cube, date, modalitet, interval_skapad, interval_svarad))')
+    con.execute('CREATE TABLE IF NOT EXISTS sketch (date INTEGER, modalitet TEXT, interval_svarad REAL, bin INTEGER, '
+                'antal INTEGER, PRIMARY KEY (date, modalitet, interval_svarad, bin))')
+    stored = dict(con.execute('SELECT key, value FROM meta WHERE key IN (?, ?)', ('selectors', 'boundaries')))
+    current = _meta(boundaries)
+    if not stored:
+        con.executemany('INSERT INTO meta VALUES (?, ?)', current.items())
+        con.commit()
+    elif stored != current:
+        con.close()
+        # Lagrade räkningar kan inte räknas om utan rådata, så ändrade selektorer eller intervall kräver ny inläsning.
+        raise ValueError('{} byggdes med andra selektorer eller tidsintervall, ta bort filen och läs in allt igen'
+                         .format(store))
+    return con
+
+
+def watermark(store: str) -> pd.Timestamp:
+    """Return the latest 'bestallningstidpunkt' ingested into the store, NaT for an empty or missing store"""
+    if not os.path.exists(store):
+        return pd.NaT
+    with sqlite3.connect(store) as con:
+        row = con.execute('SELECT value FROM meta WHERE key = ?', ('watermark',)).fetchone()
+    return pd.NaT if row is None else pd.Timestamp(row[0])
+
+
+def _bucket(rows: DataFrame, cache_path: str, boundaries: Sequence[int]) -> DataFrame:
+    modalitet, _ = assign_modality(rows.undersokning, cache_path=cache_path)
+    return DataFrame({
+        'modalitet': modalitet.astype(object).to_numpy(),
+        'interval_skapad': interval_codes(rows.bestallningstidpunkt, boundaries),
+        'interval_svarad': interval_codes(rows.svar_mottogs, boundaries),
+        'bestallningstidpunkt': rows.bestallningstidpunkt.to_numpy(),
+        'svar_mottogs': rows.svar_mottogs.to_numpy()
+    }, index=rows.index)
+
+
+def _add_cells(con: sqlite3.Connection, name: str, cube: Cube, sign: int = 1):
+    cells = cube_cells(cube)
+    con.executemany(
+        'INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (cube, date, modalitet, interval_skapad, '
+        'interval_svarad) DO UPDATE SET antal = antal + excluded.antal',
+        ((name, int(d), m, int(s), int(v), sign * int(a)) for d, m, s, v, a in cells.itertuples(index=False)))
+
+
+def _add_sketch(con: sqlite3.Connection, sketch: DataFrame):
+    con.executemany(
+        'INSERT INTO sketch VALUES (?, ?, ?, ?, ?) ON CONFLICT (date, modalitet, interval_svarad, bin) '
+        'DO UPDATE SET antal = antal + excluded.antal',
+        ((int(d), m, float(i), int(b), int(a)) for d, m, i, b, a in sketch.itertuples(index=False)))
+
+
+def _known(con: sqlite3.Connection, uids: np.ndarray) -> dict:
+    con.execute('CREATE TEMP TABLE IF NOT EXISTS batch (uid TEXT PRIMARY KEY)')
+    con.execute('DELETE FROM batch')
+    con.executemany('INSERT OR IGNORE INTO batch VALUES (?)', ((u,) for u in uids))
+    return dict(con.execute('SELECT uid, answered FROM seen JOIN batch USING (uid)'))
+
+
+def ingest(extract: str, store: str, chunksize: int = 1000000, cache_path: str = None,
+           boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> int:
+    """Add the acute referrals in extract that are not yet in store to the stored cubes.
+
+    Returns the number of referrals that were added or got their answer. The store is created if it does not exist.
+    """
+    con = _connect(store, boundaries)
+    mark = watermark(store)
+    pending = {u for u, in con.execute('SELECT uid FROM seen WHERE answered = 0')}
+    latest = mark
+    n = 0
+    try:
+        for chunk in read_dump_chunks(extract, chunksize, columns=COLUMNS):
+            ordered = chunk.bestallningstidpunkt
+            if not ordered.isnull().all():
+                latest = ordered.max() if pd.isnull(latest) else max(latest, ordered.max())
+            # Äldre rader än vattenmärket är redan inlästa, utom obesvarade som kan ha fått svar.
+            new = ordered.isnull() | chunk.bestallning_uid.isin(pending)
+            new |= True if pd.isnull(mark) else ordered >= mark
+            rows = chunk[new & (merge_acute(chunk) == 1.0)]
+            with_uid = rows[rows.bestallning_uid.notnull()].drop_duplicates('bestallning_uid', keep='last')
+            # Rader utan uid kan inte kännas igen och tas bara med om de är nyare än vattenmärket.
+            without_uid = rows[rows.bestallning_uid.isnull()]
+            if not pd.isnull(mark):
+                without_uid = without_uid[~(without_uid.bestallningstidpunkt <= mark)]
+            rows = pd.concat([without_uid, with_uid])
+            if rows.empty:
+                continue
+
+            known = _known(con, rows.bestallning_uid.dropna().unique())
+            state = rows.bestallning_uid.map(known)
+            answered = rows.svar_mottogs.notnull()
+            # Nya rader räknas, liksom tidigare obesvarade som nu har svar. Deras gamla celler dras ifrån först.
+            answers = (state == 0) & answered
+            counted = state.isnull() | answers
+            if not counted.any():
+                continue
+
+            bucketed = _bucket(rows[counted], cache_path, boundaries)
+            for name, timestamp in CUBES.items():
+                _add_cells(con, name, build_cube(bucketed, timestamp, boundaries))
+            # Obesvarade rader saknar tid och har inte bidragit till skissen tidigare.
+            _add_sketch(con, build_sketch(bucketed))
+            if answers.any():
+                old = _bucket(rows[answers].assign(svar_mottogs=pd.NaT), cache_path, boundaries)
+                _add_cells(con, 'skapade', build_cube(old, 'bestallningstidpunkt', boundaries), sign=-1)
+
+            uids = rows[counted & rows.bestallning_uid.notnull()]
+            con.executemany('INSERT OR REPLACE INTO seen VALUES (?, ?)',
+                            zip(uids.bestallning_uid, uids.svar_mottogs.notnull().astype(int)))
+            pending = (pending - set(uids.bestallning_uid[uids.svar_mottogs.notnull()])) | \
+                set(uids.bestallning_uid[uids.svar_mottogs.isnull()])
+            n += int(counted.sum())
+
+        con.execute('DELETE FROM cells WHERE antal = 0')
+        con.execute('DELETE FROM sketch WHERE antal = 0')
+        if not pd.isnull(latest):
+            con.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('watermark', latest.isoformat()))
+        con.commit()
+    finally:
+        con.close()
+    return n
+
+
+def load_cubes(store: str, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> Tuple[Cube, Cube]:
+    """Return the stored answered ('svar_mottogs') and created ('bestallningstidpunkt') cubes"""
+    con = _connect(store, boundaries)
+    try:
+        cubes = []
+        for name in CUBES:
+            cells = pd.read_sql_query('SELECT date, modalitet, interval_skapad, interval_svarad, antal FROM cells '
+                                      'WHERE cube = ?', con, params=(name,))
+            cubes.append(cube_from_cells(cells, boundaries))
+    finally:
+        con.close()
+    return cubes[0], cubes[1]
+
+
+def load_sketch(store: str, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> DataFrame:
+    """Return the stored turnaround time sketch"""
+    con = _connect(store, boundaries)
+    try:
+        return pd.read_sql_query('SELECT {}, bin, antal FROM sketch'.format(', '.join(SKETCH_KEYS)), con)
+    finally:
+        con.close()
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 3:
+        print('Användning: python -m remissfl.incremental <extrakt.csv> <aggregat.sqlite> [modalitetscache.sqlite]')
+        sys.exit(1)
+    _n = ingest(sys.argv[1], sys.argv[2], cache_path=sys.argv[3] if len(sys.argv) > 3 else None)
+    print('Läste in {} nya akuta remisser, vattenmärke {}'.format(_n, watermark(sys.argv[2])))
@@ -0,0 +1,110 @@
+"""Loading of the pipe separated RIS dump.
+
+The CSV is parsed once and converted to an uncompressed Feather (Arrow IPC) store with datetime64 and
+categorical columns. Later runs memory-map the store and read only the columns they need. pyarrow is optional;
+without it the CSV is parsed every time as before.
+"""
+
+import os
+import pandas as pd
+from pandas import DataFrame, Series
+import numpy as np
+from typing import Iterator, List
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+DTYPES = {
+    'bestallning_uid': str,
+    'bestallningstidpunkt': str,
+    'remiss_datum': str,
+    'remiss_tid': str,
+    'prioritet': str,
+    'akut': float,
+    'bestalld_från_vårdenhet_id': str,
+    'vardenhet_namn': str,
+    'undersokningstid': str,
+    'undersokning': str,
+    'till_sektion': str,
+    'lab_kombikakod': str,
+    'lab_vardenhet': str,
+    'svarstyp': str,
+    'svar_mottogs': str
+}
+
+DATE_COLUMNS = ['bestallningstidpunkt', 'remiss_datum', 'remiss_tid', 'undersokningstid', 'svar_mottogs']
+
+# Textkolumner med få unika värden i förhållande till antal rader lagras som kategorier.
+CATEGORY_COLUMNS = ['prioritet', 'bestalld_från_vårdenhet_id', 'vardenhet_namn', 'undersokning', 'till_sektion',
+                    'lab_kombikakod', 'lab_vardenhet', 'svarstyp']
+
+
+# Kolumn 'prioritet' har döpts om till 'akut' mellan Carestream och Sectra RIS.
+
+def is_acute(row: Series) -> float:
+    p = row['prioritet']
+    a = row['akut']
+    if pd.isnull(p):
+        return a
+    elif p == 'Normal':
+        return 0.0
+    else:
+        return 1.0
+
+
+def merge_acute(df: DataFrame) -> Series:
+    """Vectorized equivalent of applying is_acute row by row (NaN 'prioritet' falls back to 'akut')"""
+    p = df['prioritet']
+    merged = np.where(p.isnull(), df['akut'], np.where(p == 'Normal', 0.0, 1.0))
+    return Series(merged, index=df.index, dtype=float)
+
+
+def store_path_for(dump: str) -> str:
+    """Return the path of the columnar store belonging to a CSV dump"""
+    return os.path.splitext(dump)[0] + '.feather'
+
+
+def read_dump(dump: str, columns: List[str] = None) -> DataFrame:
+    """Parse the CSV dump, optionally restricted to the given columns. The CATEGORY_COLUMNS are categorical, as in
+    the columnar store."""
+    usecols = None if columns is None else list(columns)
+    return pd.read_csv(dump, sep='|', dtype=dict(DTYPES, **{c: 'category' for c in CATEGORY_COLUMNS}), usecols=usecols,
+                       parse_dates=[c for c in DATE_COLUMNS if usecols is None or c in usecols])
+
+
+def read_dump_chunks(dump: str, chunksize: int, columns: List[str] = None) -> Iterator[DataFrame]:
+    """Parse the CSV dump in chunks of at most chunksize rows"""
+    usecols = None if columns is None else list(columns)
+    return pd.read_csv(dump, sep='|', dtype=DTYPES, usecols=usecols, chunksize=chunksize,
+                       parse_dates=[c for c in DATE_COLUMNS if usecols is None or c in usecols])
+
+
+def convert_dump(dump: str, store: str = None) -> str:
+    """Convert the CSV dump to a typed Feather store and return its path"""
+    if feather is None:
+        raise ImportError('pyarrow krävs för att skapa en kolumnlagrad kopia av {}'.format(dump))
+    store = store_path_for(dump) if store is None else store
+    df = read_dump(dump)
+    df = df.astype({c: 'category' for c in CATEGORY_COLUMNS})
+    # Okomprimerat så att filen kan minnesmappas vid läsning.
+    feather.write_feather(df, store, compression='uncompressed')
+    return store
+
+
+def load_dump(dump: str, columns: List[str] = None, store: str = None) -> DataFrame:
+    """Load the dump from its columnar store, converting the CSV first if the store is missing or older.
+
+    Falls back to parsing the CSV when pyarrow is not installed.
+    """
+    if feather is None:
+        return read_dump(dump, columns=columns)
+
+    store = store_path_for(dump) if store is None else store
+    if not os.path.exists(store) or os.path.getmtime(store) < os.path.getmtime(dump):
+        print('Konverterar {} till {}...'.format(dump, store))
+        convert_dump(dump, store)
+
+    return feather.read_table(store, columns=columns, memory_map=True).to_pandas()
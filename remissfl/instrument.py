@@ -0,0 +1,126 @@
+"""Timing and memory of the stages of a run.
+
+Every stage of pipeline.Analysis runs inside a span of its RunReport, which records wall time, CPU time (including
+child processes, e.g. the plotting pool), the peak resident memory of the process so far, and the rows in and out
+plus any counts the stage adds, such as the number of unique strings. Spans nest: a stage that needs an earlier
+stage that is not computed yet contains it.
+
+The report is written as JSON (one run) or appended as JSON lines (one line per stage, to follow runs over time),
+and as folded stacks ("run;acute;raw 1234" with the time in ms spent in the stage itself) that flamegraph.pl,
+speedscope and similar tools draw as a flame graph.
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+from contextlib import contextmanager
+from statistics import median
+from typing import List
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _cpu_seconds() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    # ru_maxrss är i kB på Linux men i byte på macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+class RunReport:
+    """The spans of the stages of one run, in the order they finished. With echo every span is printed to stderr
+    when it finishes."""
+
+    def __init__(self, echo: bool = False, **info):
+        self.info = dict(info, started=datetime.datetime.now().isoformat(timespec='seconds'))
+        self.echo = echo
+        self.spans = []
+        self._stack = []
+
+    @contextmanager
+    def span(self, name: str, **fields):
+        """Measure the block as a stage. Counts can be added to the yielded dict, e.g. span['rows_out'] = n."""
+        span = dict(name=name, path=';'.join(self._stack + [name]), **fields)
+        self._stack.append(name)
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        try:
+            yield span
+        finally:
+            self._stack.pop()
+            span.update(wall_s=round(time.perf_counter() - wall, 6), cpu_s=round(_cpu_seconds() - cpu, 6),
+                        peak_rss_mb=_peak_rss_mb())
+            self.spans.append(span)
+            if self.echo:
+                print('{}{}: {:.2f} s, {:.2f} s CPU{}'.format(
+                    '  ' * len(self._stack), name, span['wall_s'], span['cpu_s'],
+                    '' if span.get('rows_out') is None else ', {} rader'.format(span['rows_out'])), file=sys.stderr)
+
+    def records(self) -> List[dict]:
+        return [dict(self.info, **span) for span in self.spans]
+
+    def folded(self) -> List[str]:
+        """Folded stacks with the time in ms spent in each stage itself, not in the stages it contains"""
+        own = {}
+        for span in self.spans:
+            own[span['path']] = own.get(span['path'], 0.0) + span['wall_s']
+            parent = span['path'].rpartition(';')[0]
+            if parent:
+                own[parent] = own.get(parent, 0.0) - span['wall_s']
+        return ['run;{} {}'.format(path, max(int(round(s * 1000)), 0)) for path, s in own.items()]
+
+    def write(self, path: str):
+        """Write the report as JSON, or append it as JSON lines if path ends with .jsonl"""
+        if path.endswith('.jsonl'):
+            with open(path, 'a', encoding='utf-8') as f:
+                for record in self.records():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(dict(self.info, stages=self.spans), f, ensure_ascii=False, indent=2)
+
+    def write_folded(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.folded()) + '\n')
+
+
+def read_records(path: str) -> List[dict]:
+    """The records of earlier runs appended to a JSON lines report"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def regressions(report: RunReport, records: List[dict], tolerance: float = 1.5, min_seconds: float = 0.5) -> list:
+    """Compare the stages of report with the median of earlier runs over the same dump in records.
+
+    Returns (stage, seconds, median seconds) for the stages that took more than tolerance times the median and at
+    least min_seconds.
+    """
+    # Jämför per stegnamn och körning, eftersom sökvägen beror på i vilken ordning stegen efterfrågades.
+    earlier = {}
+    for r in records:
+        if r.get('dump') == report.info.get('dump') and r['started'] < report.info['started']:
+            runs = earlier.setdefault(r['name'], {})
+            runs[r['started']] = runs.get(r['started'], 0.0) + r['wall_s']
+    current = {}
+    for span in report.spans:
+        current[span['name']] = current.get(span['name'], 0.0) + span['wall_s']
+    slow = []
+    for name, seconds in current.items():
+        if name in earlier:
+            usual = median(earlier[name].values())
+            if seconds >= min_seconds and seconds > tolerance * usual:
+                slow.append((name, seconds, usual))
+    return slow
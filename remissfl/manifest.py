@@ -0,0 +1,147 @@
+"""Content-hash manifest of generated outputs.
+
+For every output file the manifest records a hash of the data it was built from and of the code that built it: the
+source of the writing function's module and of the modules of the package it imports, so that a changed helper
+(e.g. export.write_siblings or plots._save) also counts. An output is only regenerated when that hash changes or
+the file, or one of the files written next to it, is missing.
+"""
+
+import os
+import ast
+import json
+import hashlib
+import importlib.util
+import types
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from typing import Callable, Sequence
+
+
+def _source_file(name: str) -> str:
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    return spec.origin if spec is not None and str(spec.origin).endswith('.py') else None
+
+
+def _package_imports(name: str, path: str) -> list:
+    # Moduler i samma paket som modulen importerar (relativa importer), även inuti funktioner.
+    package = name if os.path.basename(path) == '__init__.py' else name.rpartition('.')[0]
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level > 0:
+            base = importlib.util.resolve_name('.' * node.level + (node.module or ''), package)
+            names.append(base)
+            names.extend('{}.{}'.format(base, alias.name) for alias in node.names)
+    return names
+
+
+@lru_cache(maxsize=None)
+def code_digest(module_name: str) -> str:
+    """Return a hex digest of the source of the module and of the package modules it imports, directly or not"""
+    h = hashlib.sha256()
+    seen, todo = set(), [module_name]
+    while todo:
+        name = todo.pop()
+        path = None if name in seen else _source_file(name)
+        if path is None:
+            continue
+        seen.add(name)
+        h.update(name.encode('utf-8'))
+        with open(path, 'rb') as f:
+            h.update(f.read())
+        todo.extend(_package_imports(name, path))
+    return h.hexdigest()
+
+
+def _update(h, obj):
+    if isinstance(obj, (DataFrame, Series)):
+        h.update(repr((type(obj).__name__, obj.shape, [str(t) for t in np.atleast_1d(obj.dtypes)])).encode('utf-8'))
+        if isinstance(obj, DataFrame):
+            h.update(repr(list(obj.columns)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ma.MaskedArray):
+        _update(h, np.ma.getdata(obj))
+        _update(h, np.ma.getmaskarray(obj))
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode('utf-8'))
+        h.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object else repr(obj.tolist()).encode('utf-8'))
+    elif isinstance(obj, dict):
+        for k in sorted(obj, key=repr):
+            _update(h, k)
+            _update(h, obj[k])
+    elif isinstance(obj, (set, frozenset)):
+        for v in sorted(obj, key=repr):
+            _update(h, v)
+    elif isinstance(obj, (list, tuple)):
+        h.update('{}{}'.format(type(obj).__name__, len(obj)).encode('utf-8'))
+        for v in obj:
+            _update(h, v)
+    elif callable(obj) and hasattr(obj, '__code__'):
+        # Funktionens namn, bytekod och källkoden för dess modul, så att en ändrad plot-, skriv- eller hjälpfunktion
+        # ger en ny hash.
+        h.update(obj.__qualname__.encode('utf-8'))
+        _update(h, obj.__code__)
+        h.update(code_digest(obj.__module__).encode('utf-8'))
+    elif isinstance(obj, types.CodeType):
+        # Inte repr(), som innehåller objektets adress.
+        h.update(obj.co_code)
+        _update(h, obj.co_names)
+        _update(h, obj.co_consts)
+    else:
+        h.update(repr(obj).encode('utf-8'))
+
+
+def content_hash(*inputs) -> str:
+    """Return a hex digest of the given inputs (frames, arrays, containers, functions and scalars)"""
+    h = hashlib.sha256()
+    for obj in inputs:
+        _update(h, obj)
+    return h.hexdigest()
+
+
+def load_manifest(path: str) -> dict:
+    """Load the manifest at path, or return an empty one if it does not exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True, ensure_ascii=False)
+
+
+def is_stale(manifest: dict, output: str, digest: str) -> bool:
+    """Return True if output, or a file recorded as written with it, is missing or was built from inputs with another
+    digest"""
+    entry = manifest.get(os.path.normpath(output))
+    if not os.path.exists(output) or not isinstance(entry, dict) or entry['digest'] != digest:
+        return True
+    return not all(os.path.exists(path) for path in entry['files'])
+
+
+def record(manifest: dict, output: str, digest: str, files: Sequence[str] = ()):
+    """Record that output, and the given files written next to it, were built from inputs with digest"""
+    files = [os.path.normpath(f) for f in files if os.path.normpath(f) != os.path.normpath(output)]
+    manifest[os.path.normpath(output)] = {'digest': digest, 'files': files}
+
+
+def refresh(manifest: dict, output: str, write: Callable, *args) -> bool:
+    """Call write(*args) to regenerate output if it is stale with respect to write and args.
+
+    write may return the paths of all files it wrote, which are then checked as well. Returns True if the output was
+    written.
+    """
+    digest = content_hash(write, *args)
+    if not is_stale(manifest, output, digest):
+        return False
+    written = write(*args)
+    record(manifest, output, digest, written or ())
+    return True
@@ -0,0 +1,297 @@
+"""Modality classification of the free text 'undersokning' column.
+
+Every distinct string is classified once against the selector regexes and the result is mapped back to the
+rows through categorical codes, so the cost scales with the number of unique texts rather than rows.
+Strings that no selector matches are matched against a typo tolerant keyword index (see fuzzy.py). Classifications
+can also be kept in an on-disk SQLite cache keyed by a hash of the selectors and keywords.
+
+The selectors can be overridden from a TOML or YAML file (see load_selectors), which is how tune.py tries out edited
+regexes without touching this module.
+"""
+
+import os
+import re
+import hashlib
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series, Index
+from typing import Dict, Iterable, Tuple
+
+from .fuzzy import match_keywords, KEYWORDS, MIN_CONFIDENCE
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+_rtg_sel = r'rtg|skoliosrygg|röntgen|lungröngten|HKA|pulm|Skelettålder|gips|^lungor$|^BÖS\??$|^Buköversikt$|' \
+           r'skallfrontal|myelomskelett'
+_rtg_excl_sel = r'svälj|esofagus|hypofarynx'
+
+_dt_biopsi_sel = r'[DC]T'
+_biopsi_sel = r'biopsi'
+
+_glys_sel = r'G-lys|Glys|genomlysning|svälj|övre.*?passage|passage.*?övre|[eö]sofagus.*?passage|duodenum.*?passage|'\
+            r'passage.*?[öe]sofagus|övre buk.*?passage'
+
+ul_sel = r'ul\s|ulj|ultraljud|utraljud|utrajlud|ultrajlud|u-ljud|biopsi|PTC|PD-kateter|Urogenital us|UL-|' \
+         r'UL/flebografi|Flebografi/ul|Ul/|ulled|duplex|ulttraljud|ultaljud|ujl|ultrljud|Ultraljusleds|ultrajudsled|' \
+         r'Ul-ledd|ultaljud|Ultrljud|u-ljud|UL:s|Ultrajud|Tappning av pleuravätska|Tappning pleuravätska|UL\.|^ul$|' \
+         r'Per op UL|lever UL|Pleuradrän|pleuratappning|^UL$|\sUL$|^Ul,|Pleura tappning|Bukultarljud|Uj:|Ultraljug|' \
+         r'Uld |U/L |ullj |Ultarljud|Lungpunktion|ULD |ULlever|Ult '
+
+mr_sel = r'MR\s|MR-|MRT|MRI|MRhö|MRvä|MRCP|magnet|\sMR|MRC |MRhjärn|^MR[TI]?$|MRlever|hjärnMR|^MRC'
+
+nm_sel = r'\sPET\s|^PET\s|\sPET|-PET|PET/CT|PET-|FDG|PETCT|SPECT|DAT-|DMSA|scint|skint|scinitigrafi|scinrigrafi|' \
+         r'scintografi|scinnt|^PET$|Ventrikeltömningstest|MAG-?3|Renogram|scynt|DATSCAN|PET/[DC]T|[DC]Ttorax'
+
+dt_sel = r'DT\s|CT\s|[CD]Tai|[DC]Ttrauma|[CD]Tskalle|[DC]Tesofagus|[CD]Turografi|[CD]Tansikt|Datortomografi|[CD]T-|' \
+         r'halskärl|Passage|Pasagertg|Trauma Ct|DTthorax|Käkleder|Öra|Urinvägsöversikt|Colon|Bäckenmätning|' \
+         r'Pssageröntgen|DThö|DTvä|Passag-rtg|[DC]Tlever|[DC]Tbuk|[DC]Tflebografi|[CD]TBÖS|[DC]Tstenöversikt|[CD]T\.|' \
+         r'Buk [CD]T|[CD]Thals|spiral-?[DC]T|HRCT|lungemboli|[CD]Thjärna|D.T |Trombolys|HR CT|[DC]T_|' \
+         r'Volymmätning av bukfett och muskler|-[CD]T|\s[DC]T|^[CD]T$|^esophagus$|[CD]Tthorax|hCRT|[DC]/T |CBCT'
+
+angio_sel = r'Angio|TIPS|intervention|stomi|Cava|Interv.|Kärlkateter justering|Dialyskateter|CVP|' \
+            r'[CK]oronar\s?angiografi|ERC|coronarangiografi|PCI'
+
+granskning_sel = r'granskning|konf|demo|rond'
+
+_glys_excl_sel = r'flebo|phlebografi|mammografi'
+
+glys_sel = r'G-lys|Glys|grafi|sväljrtg|Suprapubis|Tunntarm|Sväljningsmotorik|Tarm|invagination|Magsäck|MUC|Larynx|' \
+           r'Hypofarynx|jejunostomi|Genomlysning|Esofagus|Ventrikelsond|pH-sond nedläggning|Främmande|' \
+           r'Kontraströntgen PEG|esofagus|Kontroll nefrostomi|hypopharynx/oesophagus|Genomylsning|Fluoroskopi|' \
+           r'Esofagus-?passage|sväljningspassage|passage'
+
+# OBS: exclude matchas skiftlägeskänsligt, till skillnad från övriga selektorer.
+exclude = '|'.join(['Utlån', 'EKG', 'Sekundärremiss', 'Remissgranskning', 'Pericardpunktion',
+                    'Pacemakerinläggning', 'Hjärtkateterisering', 'Gastroskopi', 'Gastrointestinal transittid',
+                    'Ekg vila', 'Duodenoskopi', ' Dialyskateter', 'CVP inläggning', 'CR - Demonstration',
+                    'Bukaortaaneurysm beh', 'Bildlagring', 'Administrativ tjänst på Fysiologen', 'Kärl artär',
+                    'Ledig rad', 'Narkosbokning', 'Endoskopi', 'Endoskopiskt ultraljud', '[CK]oloskopi'
+                    'ERCP', 'Efterbearbetning', 'Bildtjänst', 'Provligga/Provåka i modalitet', 'Babygram',
+                    'gastroscopi', 'gastroskopi', 'Transesofageal EKO', 'mammografi', 'Koppling av bilde', 'länkning',
+                    'SCAPIS', 'Inscanning', 'Anpassningsremiss'])
+
+# Modaliteter i prioritetsordning. En sträng som hamnar i flera selektioner får den första som matchar.
+MODALITIES = ('DT', 'MR', 'NM', 'Angio', 'Ulj', 'Glys', 'Rtg', 'Granskning', 'Annat')
+
+# Kategorierna för 'modalitet' sorteras alfabetiskt så att groupby ger samma ordning som för strängar.
+CATEGORIES = tuple(sorted(MODALITIES))
+
+# Selektioner som sparas under selections/, i samma ordning som filerna skrivs.
+SELECTIONS = ('ul', 'nm', 'mr', 'dt', 'angio', 'glys', 'rtg')
+
+# Alla selektorer som påverkar klassningen. Ändras någon av dessa blir cachen ogiltig.
+SELECTORS = {
+    '_rtg_sel': _rtg_sel,
+    '_rtg_excl_sel': _rtg_excl_sel,
+    '_dt_biopsi_sel': _dt_biopsi_sel,
+    '_biopsi_sel': _biopsi_sel,
+    '_glys_sel': _glys_sel,
+    'ul_sel': ul_sel,
+    'mr_sel': mr_sel,
+    'nm_sel': nm_sel,
+    'dt_sel': dt_sel,
+    'angio_sel': angio_sel,
+    'granskning_sel': granskning_sel,
+    '_glys_excl_sel': _glys_excl_sel,
+    'glys_sel': glys_sel,
+    'exclude': exclude
+}
+
+_TABLE_COLUMNS = ('ul', 'nm', 'mr', 'dt', 'angio', 'glys', 'rtg', 'granskning')
+
+
+def _compile(pattern: str, case: bool = False) -> re.Pattern:
+    return re.compile(pattern, 0 if case else re.IGNORECASE)
+
+
+_rtg_rx = _compile(_rtg_sel)
+_rtg_excl_rx = _compile(_rtg_excl_sel)
+_dt_biopsi_rx = _compile(_dt_biopsi_sel)
+_biopsi_rx = _compile(_biopsi_sel)
+_glys_rx = _compile(_glys_sel)
+ul_rx = _compile(ul_sel)
+mr_rx = _compile(mr_sel)
+nm_rx = _compile(nm_sel)
+dt_rx = _compile(dt_sel)
+angio_rx = _compile(angio_sel)
+granskning_rx = _compile(granskning_sel)
+_glys_excl_rx = _compile(_glys_excl_sel)
+glys_rx = _compile(glys_sel)
+exclude_rx = _compile(exclude, case=True)
+
+
+def _search(rx: re.Pattern, strings: list) -> np.ndarray:
+    return np.fromiter((rx.search(s) is not None for s in strings), dtype=bool, count=len(strings))
+
+
+def selector_matches(strings: list, selectors: dict = None, memo: dict = None) -> Dict[str, np.ndarray]:
+    """Return a boolean array per selector telling which strings it matches.
+
+    Given a memo dict (kept by the caller between calls over the same strings), a selector is only searched again
+    when its pattern has changed.
+    """
+    if selectors is None:
+        rxs = {'_rtg_sel': _rtg_rx, '_rtg_excl_sel': _rtg_excl_rx, '_dt_biopsi_sel': _dt_biopsi_rx,
+               '_biopsi_sel': _biopsi_rx, '_glys_sel': _glys_rx, 'ul_sel': ul_rx, 'mr_sel': mr_rx, 'nm_sel': nm_rx,
+               'dt_sel': dt_rx, 'angio_sel': angio_rx, 'granskning_sel': granskning_rx,
+               '_glys_excl_sel': _glys_excl_rx, 'glys_sel': glys_rx, 'exclude': exclude_rx}
+    else:
+        rxs = {name: _compile(selectors[name], case=name == 'exclude') for name in SELECTORS}
+    matches = {}
+    for name, rx in rxs.items():
+        key = (name, rx.pattern)
+        if memo is not None and key in memo:
+            matches[name] = memo[key]
+            continue
+        matches[name] = _search(rx, strings)
+        if memo is not None:
+            memo[key] = matches[name]
+    return matches
+
+
+def classify_unique(strings: Iterable[str], selectors: dict = None, memo: dict = None) -> DataFrame:
+    """Classify distinct 'undersokning' strings.
+
+    Returns a frame indexed by the strings with one boolean column per selection set (the same sets the
+    original per-modality filters produced) and the resulting 'modalitet' in precedence order. Strings that no
+    selector matches are looked up in the keyword index of fuzzy.py instead of all becoming 'Rtg'. selectors
+    defaults to SELECTORS, and memo is passed on to selector_matches.
+    """
+    strings = list(strings)
+    m = selector_matches(strings, selectors, memo)
+
+    # Strängar som ingen selektor matchar klassas med nyckelordsindexet om det är tillräckligt säkert (se fuzzy.py).
+    unmatched = np.flatnonzero(~np.logical_or.reduce(list(m.values())))
+    keywords = match_keywords([strings[i] for i in unmatched])
+    sure = (keywords.konfidens >= MIN_CONFIDENCE).to_numpy()
+    fuzzy = {modality: np.zeros(len(strings), dtype=bool) for modality in KEYWORDS}
+    for modality, i in zip(keywords.modalitet[sure], unmatched[sure]):
+        fuzzy[modality][i] = True
+
+    _rtg = m['_rtg_sel'] & ~m['_rtg_excl_sel']
+    _dt = m['_dt_biopsi_sel'] & m['_biopsi_sel']
+    _glys = m['_glys_sel']
+    ul = m['ul_sel'] & ~(_rtg | _dt | _glys) | fuzzy['Ulj']
+    mr = m['mr_sel'] | fuzzy['MR']
+    nm = m['nm_sel'] | fuzzy['NM']
+    dt = m['dt_sel'] & ~(mr | ul | nm | _glys) | fuzzy['DT']
+    angio = m['angio_sel'] & ~(dt | mr | nm | ul | _glys) | fuzzy['Angio']
+    granskning = m['granskning_sel']
+    _glys_excl = m['_glys_excl_sel']
+    glys = m['glys_sel'] & ~(dt | mr | nm | ul | angio | _rtg | _glys_excl | granskning) | fuzzy['Glys']
+    rtg = ~(dt | mr | angio | ul | nm | glys | granskning | m['exclude'])
+
+    modalitet = np.select([dt, mr, nm, angio, ul, glys, rtg, granskning], MODALITIES[:-1], default='Annat')
+
+    return DataFrame({'ul': ul, 'nm': nm, 'mr': mr, 'dt': dt, 'angio': angio, 'glys': glys, 'rtg': rtg,
+                      'granskning': granskning, 'modalitet': modalitet},
+                     index=Index(strings, name='undersokning', dtype=object))
+
+
+def load_selectors(path: str) -> dict:
+    """Read selector overrides from a TOML (.toml) or YAML (.yaml, .yml) file and merge them into SELECTORS.
+
+    The file maps selector names (keys of SELECTORS) to a regex, or to a list of alternatives that are joined with
+    '|'. Selectors not in the file keep their built-in patterns.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.toml':
+        if tomllib is None:
+            raise ImportError('tomllib (Python 3.11+) krävs för att läsa {}'.format(path))
+        with open(path, 'rb') as f:
+            overrides = tomllib.load(f)
+    elif ext in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ImportError('PyYAML krävs för att läsa {}'.format(path))
+        with open(path, encoding='utf-8') as f:
+            overrides = yaml.safe_load(f) or {}
+    else:
+        raise ValueError('Okänt format för selektorer: {}'.format(path))
+
+    unknown = set(overrides) - set(SELECTORS)
+    if unknown:
+        raise ValueError('Okända selektorer i {}: {}'.format(path, ', '.join(sorted(unknown))))
+    selectors = dict(SELECTORS)
+    for name, pattern in overrides.items():
+        selectors[name] = '|'.join(pattern) if isinstance(pattern, list) else pattern
+    return selectors
+
+
+def selectors_hash(selectors: dict = None) -> str:
+    """Return a hex digest identifying the selector regexes, the modality precedence and the keywords"""
+    selectors = SELECTORS if selectors is None else selectors
+    h = hashlib.sha256()
+    for name in sorted(selectors):
+        h.update('{}={}\n'.format(name, selectors[name]).encode('utf-8'))
+    h.update('|'.join(MODALITIES).encode('utf-8'))
+    h.update('{}\n{}'.format(sorted(KEYWORDS.items()), MIN_CONFIDENCE).encode('utf-8'))
+    return h.hexdigest()
+
+
+def classify_cached(strings: Iterable[str], cache_path: str) -> DataFrame:
+    """Same as classify_unique but looks up previously classified strings in a SQLite cache.
+
+    Only strings missing from the cache are matched against the selectors, and their classification is stored.
+    The whole cache is discarded when the selectors hash differs from the one it was built with.
+    """
+    strings = list(strings)
+    digest = selectors_hash()
+    columns = ', '.join('{} INTEGER NOT NULL'.format(c) for c in _TABLE_COLUMNS)
+
+    con = sqlite3.connect(cache_path)
+    try:
+        with con:
+            con.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            con.execute('CREATE TABLE IF NOT EXISTS classification '
+                        '(undersokning TEXT PRIMARY KEY, {}, modalitet TEXT NOT NULL)'.format(columns))
+            stored = con.execute("SELECT value FROM meta WHERE key = 'selectors'").fetchone()
+            if stored is None or stored[0] != digest:
+                con.execute('DELETE FROM classification')
+                con.execute("INSERT OR REPLACE INTO meta VALUES ('selectors', ?)", (digest,))
+
+        known = pd.read_sql_query('SELECT * FROM classification', con, index_col='undersokning')
+        unseen = [s for s in strings if s not in known.index]
+        if unseen:
+            fresh = classify_unique(unseen)
+            with con:
+                con.executemany('INSERT OR REPLACE INTO classification VALUES ({})'
+                                .format(', '.join('?' * (len(_TABLE_COLUMNS) + 2))),
+                                ((s,) + tuple(int(v) for v in row[:-1]) + (row[-1],)
+                                 for s, row in zip(fresh.index, fresh.itertuples(index=False))))
+            known = pd.concat([known, fresh])
+    finally:
+        con.close()
+
+    table = known.reindex(strings)
+    table = table.astype({c: bool for c in _TABLE_COLUMNS})
+    table.index = Index(strings, name='undersokning', dtype=object)
+    return table
+
+
+def assign_modality(undersokning: Series, cache_path: str = None) -> Tuple[Series, DataFrame]:
+    """Return a categorical 'modalitet' column for every row together with the per-string classification table.
+
+    Missing 'undersokning' values are classed as 'Annat'. If cache_path is given, classifications are looked up
+    in (and added to) the SQLite cache at that path, see classify_cached.
+    """
+    codes, uniques = pd.factorize(undersokning)
+    table = classify_unique(uniques) if cache_path is None else classify_cached(uniques, cache_path)
+    # Sista elementet fångar kod -1 (saknat värde) från factorize.
+    lookup = np.append(pd.Categorical(table.modalitet, categories=CATEGORIES).codes, CATEGORIES.index('Annat'))
+    modalitet = pd.Categorical.from_codes(lookup[codes], categories=CATEGORIES)
+    return Series(modalitet, index=undersokning.index, name='modalitet'), table
+
+
+def selection(table: DataFrame, name: str) -> set:
+    """Return the set of strings in the named selection of a classification table"""
+    return set(table.index[table[name]])
@@ -0,0 +1,546 @@
+"""The analysis as lazily evaluated, memoized stages.
+
+    analysis = Analysis('rtg_huddinge_2010-2019.csv')
+    analysis.system_means  # laddar, klassar och räknar bara det som behövs
+
+The stages are load -> acute filter -> classify -> calendar and interval features -> count cubes -> tables ->
+outputs. Every stage is computed the first time something asks for it and then kept, so a consumer that only needs
+one table never pays for the stages it does not use, such as xlsx export or plotting. With an aggregates store (see
+incremental.py) the cubes, and so all count tables, are read from the store without loading the rows of the dump.
+With a chunk size the dump is read in chunks and only their counts are kept (see streaming.py).
+
+Each stage runs in a span of the analysis' report (see instrument.py), which records its time, memory and rows.
+"""
+
+import os
+import sys
+import datetime
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series, Timedelta
+from functools import cached_property, wraps
+from typing import Callable, Dict, List, Sequence
+
+from .ingest import load_dump, read_dump_chunks, merge_acute
+from .modality import assign_modality, selection, SELECTIONS
+from .coverage import Coverage, string_counts, coverage, missed_strings, keyword_matches
+from .features import interval_codes, calendar_columns, check_boundaries, INTERVAL_BOUNDARIES
+from .cube import Cube, build_cube, cube_window, cube_counts, covered_months, calendar_grid
+from .incremental import ingest, load_cubes, load_sketch
+from .turnaround import turnaround_hours, describe_turnaround, build_sketch, sketch_quantiles
+from .backlog import peak_backlog
+from .shards import Shard, SHARDS, shard_keys, run_shards, merge_shards
+from .streaming import Streamed, stream_aggregate
+from .manifest import load_manifest, save_manifest, refresh
+from .instrument import RunReport
+
+
+# Endast de kolumner som analysen använder läses in.
+COLUMNS = ['prioritet', 'akut', 'undersokning', 'bestallningstidpunkt', 'svar_mottogs']
+
+# Kolumnerna som behålls för akuta remisser, när 'prioritet' och 'akut' har använts för att välja ut dem.
+ACUTE_COLUMNS = ['undersokning', 'bestallningstidpunkt', 'svar_mottogs']
+
+# Intervallkoder, se features.interval_codes och N_BOUNDARIES.
+DAG = [1, 2]
+JOUR = [3, 4, 5]
+SEN_JOUR = [5]
+MODALITETER = ['DT', 'Rtg', 'Glys', 'Ulj']
+
+# Datum nya joursystemet infördes.
+SYSTEM_CHANGE = datetime.datetime(2019, 2, 11)
+
+# Filtervärden som står för alla år med besvarade remisser och för de valda modaliteterna (namn på attribut hos
+# Analysis).
+YEARS = 'years'
+CHOSEN_MODALITIES = 'modalities'
+
+# Tabellnamn -> (kub, grupperingsnycklar, filter), se cube.cube_counts.
+# Prefix _b -> 'besvarade', prefix _s -> 'skapade'.
+TABLES = {
+    'counts_alla_svarade': ('svarade', ['year', 'interval_svarad'], {}),
+    'counts_alla_skapade': ('skapade', ['year', 'interval_skapad'], {}),
+    'counts_svarade': ('svarade', ['year', 'modalitet', 'interval_svarad'], {}),
+    'counts_skapade': ('skapade', ['year', 'modalitet', 'interval_skapad'], {}),
+    'dag_alla_svarade': ('svarade', ['year'], {'interval_svarad': DAG, 'year': YEARS}),
+    'dag_alla_skapade': ('skapade', ['year'], {'interval_skapad': DAG, 'year': YEARS}),
+    'jour_alla_svarade': ('svarade', ['year'], {'interval_svarad': JOUR, 'year': YEARS}),
+    'jour_alla_skapade': ('skapade', ['year'], {'interval_skapad': JOUR, 'year': YEARS}),
+    'sen_jour_alla_svarade': ('svarade', ['year'], {'interval_svarad': SEN_JOUR, 'year': YEARS}),
+    'sen_jour_alla_skapade': ('skapade', ['year'], {'interval_skapad': SEN_JOUR, 'year': YEARS}),
+    'jour_svarade': ('svarade', ['year', 'modalitet'], {'interval_svarad': JOUR, 'year': YEARS,
+                                                        'modalitet': CHOSEN_MODALITIES}),
+    'jour_skapade': ('skapade', ['year', 'modalitet'], {'interval_skapad': JOUR, 'year': YEARS,
+                                                        'modalitet': CHOSEN_MODALITIES}),
+    'sen_jour_svarade': ('svarade', ['year', 'modalitet'], {'interval_svarad': SEN_JOUR, 'year': YEARS,
+                                                            'modalitet': CHOSEN_MODALITIES}),
+    'sen_jour_skapade': ('skapade', ['year', 'modalitet'], {'interval_skapad': SEN_JOUR, 'year': YEARS,
+                                                            'modalitet': CHOSEN_MODALITIES}),
+    'ej_jour_skapade': ('skapade', ['year', 'modalitet'], {'interval_skapad': DAG, 'year': YEARS,
+                                                           'modalitet': CHOSEN_MODALITIES}),
+    '_b_dag_by_month_and_day': ('svarade', ['year', 'month', 'day'], {'interval_svarad': DAG}),
+    '_b_jour_by_month_and_day': ('svarade', ['year', 'month', 'day'], {'interval_svarad': JOUR}),
+    '_b_dag_by_month': ('svarade', ['year', 'month'], {'interval_svarad': DAG}),
+    '_b_jour_by_month': ('svarade', ['year', 'month'], {'interval_svarad': JOUR}),
+    '_b_dag_by_weekday': ('svarade', ['weekday', 'year'], {'interval_svarad': DAG}),
+    '_b_jour_by_weekday': ('svarade', ['weekday', 'year'], {'interval_svarad': JOUR}),
+    '_b_dag_by_month_and_weekday': ('svarade', ['year', 'month', 'weekday'], {'interval_svarad': DAG}),
+    '_b_jour_by_month_and_weekday': ('svarade', ['year', 'month', 'weekday'], {'interval_svarad': JOUR}),
+    '_s_dag_by_month': ('skapade', ['year', 'month'], {'interval_skapad': DAG}),
+    '_s_jour_by_month': ('skapade', ['year', 'month'], {'interval_skapad': JOUR}),
+    # Jämför endast tillgängliga månader i 2019 (januari - mars)
+    '_jan_mar_b_dag': ('svarade', ['year', 'month'], {'interval_svarad': DAG, 'month': [1, 2, 3]}),
+    '_jan_mar_b_jour': ('svarade', ['year', 'month'], {'interval_svarad': JOUR, 'month': [1, 2, 3]}),
+    '_jan_mar_b_sen_jour': ('svarade', ['year', 'month'], {'interval_svarad': SEN_JOUR, 'month': [1, 2, 3]}),
+    '_jan_mar_s_dag': ('skapade', ['year', 'month'], {'interval_skapad': DAG, 'month': [1, 2, 3]}),
+    '_jan_mar_s_jour': ('skapade', ['year', 'month'], {'interval_skapad': JOUR, 'month': [1, 2, 3]}),
+    '_jan_mar_s_sen_jour': ('skapade', ['year', 'month'], {'interval_skapad': SEN_JOUR, 'month': [1, 2, 3]})
+}
+
+# Arbetsbok -> tabell, för tabeller som skrivs utan index.
+WORKBOOKS = {
+    'dagtid_per_månad_och_veckodag.xlsx': '_b_dag_by_month_and_weekday',
+    'jourtid_per_månad_och_veckodag.xlsx': '_b_jour_by_month_and_weekday'
+}
+
+
+def _rows(value) -> int:
+    if isinstance(value, (DataFrame, Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, tuple) and value:
+        return _rows(value[0])
+    return value if isinstance(value, int) else None
+
+
+def stage(rows_in: str = None, **counts: Callable) -> cached_property:
+    """A cached_property that is computed in a span of the report.
+
+    rows_in names the stage whose rows go in, and each keyword adds a count of the result to the span, e.g.
+    unique_strings=len.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def measured(self):
+            with self.report.span(fn.__name__) as span:
+                result = fn(self)
+                span.update(rows_in=_rows(self.__dict__.get(rows_in)), rows_out=_rows(result),
+                            **{name: count(result) for name, count in counts.items()})
+            return result
+        return cached_property(measured)
+    return decorate
+
+
+def step(fn: Callable) -> Callable:
+    """A method that runs in a span of the report"""
+    @wraps(fn)
+    def measured(self, *args, **kwargs):
+        with self.report.span(fn.__name__):
+            return fn(self, *args, **kwargs)
+    return measured
+
+
+def save_selection_strings(path: str, strings: set):
+    with open(path, 'w') as w:
+        for v in strings:
+            w.write(v + '\n')
+
+
+class Analysis:
+    """The acute referral analysis of one dump.
+
+    Stages are properties computed on first access. Output paths default to subdirectories of work_dir. With
+    aggregates (path to an incremental.py store) new rows of the dump are ingested into the store and the count
+    tables come from it. With delta_sketches the turnaround quantile workbooks are written as well.
+
+    start and end limit the analysis to the referrals answered (created, for tables over created referrals) from the
+    date of start through the date of end. modalities replaces MODALITETER in the per-modality tables.
+
+    With shard_by ('site', 'unit' or 'year', see shards.py) the cubes and sketch are aggregated per shard in a pool of
+    processes processes and merged, and shard(key) gives the analysis of a single shard.
+
+    With chunksize the dump is read chunksize rows at a time and only the cubes, the turnaround sketch and the string
+    counts are kept (see streaming.py). The stages that need the rows themselves (akuta, deltas, turnaround, backlog)
+    are then not available.
+    """
+
+    def __init__(self, dump: str, work_dir: str = '.', modality_cache: str = None, aggregates: str = None,
+                 delta_sketches: bool = False, boundaries: Sequence[int] = INTERVAL_BOUNDARIES,
+                 start: pd.Timestamp = None, end: pd.Timestamp = None, modalities: Sequence[str] = MODALITETER,
+                 shard_by: str = None, processes: int = None, chunksize: int = None):
+        self.dump = dump
+        self.work_dir = work_dir
+        self.selections_dir = os.path.join(work_dir, 'selections')
+        self.figures_dir = os.path.join(work_dir, 'figures')
+        self.xlsx_dir = os.path.join(work_dir, 'xlsx')
+        self.manifest_path = os.path.join(work_dir, 'manifest.json')
+        self.modality_cache = modality_cache
+        self.aggregates = aggregates
+        self.delta_sketches = delta_sketches
+        self.boundaries = check_boundaries(boundaries)
+        self.start = None if start is None else pd.Timestamp(start).normalize()
+        self.end = None if end is None else pd.Timestamp(end).normalize()
+        self.modalities = list(modalities)
+        self.shard_by = shard_by
+        self.processes = processes
+        self.chunksize = chunksize
+        self._tables = {}
+        self.report = RunReport(dump=dump, start=None if start is None else str(self.start.date()),
+                                end=None if end is None else str(self.end.date()), aggregates=aggregates)
+
+    def in_window(self, ts: Series) -> np.ndarray:
+        """Whether the dates of the timestamps are within start and end"""
+        days = ts.dt.normalize()
+        keep = ts.notna().to_numpy(copy=True)
+        if self.start is not None:
+            keep &= (days >= self.start).to_numpy()
+        if self.end is not None:
+            keep &= (days <= self.end).to_numpy()
+        return keep
+
+    # --- Rader ---
+
+    @stage()
+    def raw(self) -> DataFrame:
+        """The columns in COLUMNS of the dump, and the column the shards are split on"""
+        extra = [] if self.shard_by is None or SHARDS[self.shard_by] in COLUMNS else [SHARDS[self.shard_by]]
+        return load_dump(self.dump, columns=COLUMNS + extra)
+
+    def acute_rows(self, df: DataFrame) -> DataFrame:
+        """The ACUTE_COLUMNS of the acute referrals of df"""
+        # Kolumn 'prioritet' har döpts om till 'akut' mellan Carestream och Sectra RIS. Slå ihop.
+        acute = (merge_acute(df) == 1.0).to_numpy(copy=True)
+        if self.start is not None or self.end is not None:
+            # Remisser som varken skapades eller besvarades inom perioden ingår inte i någon tabell.
+            acute &= self.in_window(df.bestallningstidpunkt) | self.in_window(df.svar_mottogs)
+        return df.loc[acute, ACUTE_COLUMNS]
+
+    @stage(rows_in='raw')
+    def acute(self) -> DataFrame:
+        """The ACUTE_COLUMNS of the acute referrals"""
+        if self.chunksize is not None:
+            raise ValueError('Med chunksize läses dump i delar och raderna behålls inte (se streaming.py).')
+        return self.acute_rows(self.raw)
+
+    @stage(dump_rows=lambda streamed: streamed.rows, referrals=lambda streamed: streamed.totals.rows)
+    def streamed(self) -> Streamed:
+        """The cubes, sketch and string counts of the dump, read chunksize rows at a time"""
+        # Förloppet skrivs bara ut med --verbose, som spannen i rapporten.
+        progress = None
+        if self.report.echo:
+            progress = lambda rows: print('  Behandlat {} rader...'.format(rows), file=sys.stderr)
+        return stream_aggregate(read_dump_chunks(self.dump, self.chunksize, columns=COLUMNS), self.acute_rows,
+                                self.modality_cache, self.boundaries, progress)
+
+    @cached_property
+    def dump_shape(self) -> tuple:
+        """The number of rows and columns read from the dump"""
+        return self.raw.shape if self.chunksize is None else (self.streamed.rows, len(COLUMNS))
+
+    @stage(rows_in='acute', unique_strings=len)
+    def undersokning_counts(self) -> Series:
+        if self.chunksize is not None:
+            return self.streamed.strings
+        return string_counts(self.acute.undersokning)
+
+    @stage(rows_in='undersokning_counts')
+    def coverage(self) -> Coverage:
+        return coverage(self.undersokning_counts)
+
+    def missed(self, n: int = None) -> DataFrame:
+        """The strings among the n most common that no selector matches, most referrals first"""
+        return missed_strings(self.coverage, n)
+
+    def keyword_matches(self, n: int = None) -> DataFrame:
+        """The strings among the n most common that only the keyword index classifies, least confident first"""
+        return keyword_matches(self.coverage, n)
+
+    @stage(rows_in='acute', unique_strings=lambda result: len(result[1]))
+    def classification(self) -> tuple:
+        """The categorical 'modalitet' of every acute referral and the classification of every distinct string"""
+        return assign_modality(self.acute.undersokning, cache_path=self.modality_cache)
+
+    @stage()
+    def selections(self) -> Dict[str, set]:
+        """The strings of every selection set, e.g. selections['ul']"""
+        table = self.classification[1] if self.chunksize is None else self.streamed.classes
+        selections = {name: selection(table, name) for name in SELECTIONS + ('granskning',)}
+        selections['unclassed'] = set(table.index[table.modalitet == 'Annat'])
+        return selections
+
+    @stage(rows_in='acute')
+    def akuta(self) -> DataFrame:
+        """The acute referrals with modality, intervals and the calendar columns of svar_mottogs.
+
+        The frame is kept small: 'undersokning' and 'modalitet' are categorical, the intervals nullable int8 and the
+        calendar columns small integers. The turnaround time is computed from the timestamps where it is needed.
+        """
+        acute = self.acute
+        return acute.assign(modalitet=self.classification[0],
+                            interval_skapad=pd.array(interval_codes(acute.bestallningstidpunkt, self.boundaries),
+                                                     dtype='Int8'),
+                            interval_svarad=pd.array(interval_codes(acute.svar_mottogs, self.boundaries),
+                                                     dtype='Int8'),
+                            **calendar_columns(acute.svar_mottogs))
+
+    # --- Delar ---
+
+    @stage(rows_in='acute', shards=len)
+    def partitions(self) -> Dict[str, DataFrame]:
+        """The acute referrals split by shard_by (see shards.py)"""
+        acute = self.acute
+        keys = shard_keys(acute if self.shard_by == 'year' else self.raw.loc[acute.index], self.shard_by)
+        return {key: part for key, part in acute.groupby(keys.to_numpy(), sort=True)}
+
+    @stage(rows_in='acute', shards=len)
+    def shards(self) -> Dict[str, Shard]:
+        """The cubes and sketch of every shard, aggregated in a pool of processes"""
+        return run_shards(self.partitions, self.processes, self.modality_cache, self.boundaries)
+
+    @stage(rows_in='acute')
+    def merged_shards(self) -> Shard:
+        return merge_shards(self.shards.values())
+
+    def shard(self, key: str) -> 'Analysis':
+        """The analysis of one shard, with its outputs in <work_dir>/<shard_by>/<key>"""
+        part = Analysis(self.dump, os.path.join(self.work_dir, self.shard_by, key), self.modality_cache,
+                        delta_sketches=self.delta_sketches, boundaries=self.boundaries, start=self.start,
+                        end=self.end, modalities=self.modalities, shard_by=self.shard_by, processes=self.processes)
+        part.report = self.report
+        part.acute = self.partitions[key]
+        part.shards = {key: self.shards[key]}
+        return part
+
+    # --- Kuber och tabeller ---
+
+    @stage()
+    def ingested(self) -> int:
+        """The number of new acute referrals added to the aggregates store"""
+        return ingest(self.dump, self.aggregates, cache_path=self.modality_cache, boundaries=self.boundaries)
+
+    @stage(rows_in='akuta', referrals=lambda cubes: int(cubes['svarade'].counts.sum()))
+    def cubes(self) -> Dict[str, Cube]:
+        """The count cubes over svar_mottogs ('svarade') and bestallningstidpunkt ('skapade')"""
+        if self.aggregates is not None:
+            self.ingested
+            svarade, skapade = load_cubes(self.aggregates, self.boundaries)
+        elif self.shard_by is not None:
+            svarade, skapade = self.merged_shards.svarade, self.merged_shards.skapade
+        elif self.chunksize is not None:
+            svarade, skapade = self.streamed.totals.svarade, self.streamed.totals.skapade
+        else:
+            svarade = build_cube(self.akuta, 'svar_mottogs', self.boundaries)
+            skapade = build_cube(self.akuta, 'bestallningstidpunkt', self.boundaries)
+        return {'svarade': cube_window(svarade, self.start, self.end),
+                'skapade': cube_window(skapade, self.start, self.end)}
+
+    def table(self, name: str) -> DataFrame:
+        """Return the count table with the given name in TABLES"""
+        if name not in self._tables:
+            cube, by, filters = TABLES[name]
+            filters = {k: getattr(self, v) if isinstance(v, str) else v for k, v in filters.items()}
+            with self.report.span(name) as span:
+                self._tables[name] = cube_counts(self.cubes[cube], by, **filters)
+                span['rows_out'] = len(self._tables[name])
+        return self._tables[name]
+
+    @cached_property
+    def years(self) -> List[int]:
+        """The years with answered referrals"""
+        return sorted(self.table('counts_alla_svarade').year.unique().tolist())
+
+    @stage()
+    def system_counts(self) -> DataFrame:
+        """Referrals created 00:00 - 07:30 per day and modality in 2018 - 2019, with the on-call system in use"""
+        # inrem ska ringa för us efter kl 00:00 = system 0
+        # inrem ska inte ringa för us efter kl 00:00 = system 1
+        counts = cube_counts(self.cubes['skapade'], ['datum', 'modalitet'], interval_skapad=SEN_JOUR,
+                             year=[2018, 2019], modalitet=self.modalities)
+        counts.insert(0, 'system', np.where(pd.to_datetime(counts.datum) < SYSTEM_CHANGE, 0, 1))
+        return counts
+
+    @stage(rows_in='system_counts')
+    def system_means(self) -> DataFrame:
+        return self.system_counts.groupby(['system', 'modalitet']).mean(numeric_only=True).add_prefix('medel_')
+
+    def calendar_grids(self) -> Dict[str, np.ma.MaskedArray]:
+        """The per-month and per-weekday tables as dense year x month (weekday) arrays, masked outside the period of
+        the data (see cube.calendar_grid)"""
+        covered = covered_months(self.cubes['svarade'])
+        grids = {name: calendar_grid(self.table(name), 'month', self.years, covered)
+                 for name in ['_b_dag_by_month', '_b_jour_by_month', '_s_dag_by_month', '_s_jour_by_month']}
+        grids.update({name: calendar_grid(self.table(name), 'weekday', self.years, covered)
+                      for name in ['_b_dag_by_weekday', '_b_jour_by_weekday']})
+        return grids
+
+    # --- Svarstider ---
+
+    def answered(self, intervals: Sequence[int], columns: List[str] = None) -> DataFrame:
+        """The given columns (default all) of the acute referrals answered in the given intervals"""
+        akuta = self.akuta
+        rows = akuta.interval_svarad.isin(intervals).to_numpy() & self.in_window(akuta.svar_mottogs)
+        # Kopiera bara de kolumner som behövs.
+        return akuta.loc[rows, columns if columns is not None else akuta.columns]
+
+    def deltas(self, intervals: Sequence[int]) -> DataFrame:
+        """Year and turnaround time of the referrals answered in the given intervals within 24 hours"""
+        # Remove extreme (not really acute) records: keep only records where svar_mottogs is within 24h of
+        # bestallningtidpunkt
+        b = self.answered(intervals, ['year', 'bestallningstidpunkt', 'svar_mottogs'])
+        b = b[(b.svar_mottogs - b.bestallningstidpunkt) <= Timedelta('1 days 00:00:00')]
+        return DataFrame({'year': b.year, 'delta_t': turnaround_hours(b)})
+
+    @step
+    def turnaround(self, intervals: Sequence[int]) -> DataFrame:
+        """describe() of the turnaround time per year, month and weekday, for referrals answered within 24 hours"""
+        return describe_turnaround(self.answered(intervals, ['year', 'month', 'weekday', 'bestallningstidpunkt',
+                                                             'svar_mottogs']),
+                                   ['year', 'month', 'weekday'], within=Timedelta('1 days 00:00:00'))
+
+    @stage(rows_in='akuta')
+    def sketch(self) -> DataFrame:
+        """The turnaround time sketch, from the rows or the aggregates store"""
+        if self.aggregates is not None:
+            self.ingested
+            sketch = load_sketch(self.aggregates, self.boundaries)
+        elif self.shard_by is not None:
+            sketch = self.merged_shards.sketch
+        elif self.chunksize is not None:
+            sketch = self.streamed.totals.sketch
+        else:
+            sketch = build_sketch(self.akuta)
+        date = sketch['date'].to_numpy(dtype='int64')
+        keep = np.ones(len(sketch), dtype=bool)
+        if self.start is not None:
+            keep &= date >= int(self.start.strftime('%Y%m%d'))
+        if self.end is not None:
+            keep &= date <= int(self.end.strftime('%Y%m%d'))
+        return sketch[keep]
+
+    @stage(rows_in='akuta')
+    def backlog(self) -> DataFrame:
+        """Peak and mean number of open referrals per modality and interval of the day (see backlog.py)"""
+        end = None if self.end is None else self.end + Timedelta('1 days') - Timedelta('1 min')
+        peaks = peak_backlog(self.akuta, start=self.start, end=end, boundaries=self.boundaries)
+        return peaks[peaks['modalitet'].isin(['Alla'] + self.modalities)].reset_index(drop=True)
+
+    # --- Utdata ---
+
+    @cached_property
+    def outputs(self) -> dict:
+        """The manifest of generated files (see manifest.py)"""
+        return load_manifest(self.manifest_path)
+
+    @step
+    def write_selections(self):
+        os.makedirs(self.selections_dir, exist_ok=True)
+        for name in SELECTIONS:
+            path = os.path.join(self.selections_dir, name + '.txt')
+            refresh(self.outputs, path, save_selection_strings, path, self.selections[name])
+        save_manifest(self.outputs, self.manifest_path)
+
+    @step
+    def write_workbooks(self):
+        # xlsxwriter laddas bara när arbetsböcker faktiskt skrivs.
+        from .export import export_table
+        os.makedirs(self.xlsx_dir, exist_ok=True)
+        # Arbetsböckerna skrivs rad för rad tillsammans med en CSV- (och Parquet-) kopia, se export.py.
+        for filename, name in WORKBOOKS.items():
+            path = os.path.join(self.xlsx_dir, filename)
+            refresh(self.outputs, path, export_table, path, self.table(name), None, False)
+
+        path = os.path.join(self.xlsx_dir, 'joursystem_nya_vs_gamla.xlsx')
+        refresh(self.outputs, path, export_table, path,
+                self.system_counts.groupby(['system', 'modalitet']).describe(),
+                'Genomsnitt antal remisser i nya systemet fr.o.m 2019-02-11 (= 1) vs gamla (= 0)')
+
+        # Utan rader (chunksize) sammanfattas svarstiden endast med kvantilerna ur skissen.
+        deltas = [] if self.chunksize is not None else [(DAG, 'tid_deltas_dag.xlsx', 'dagtid'),
+                                                        (JOUR, 'tid_deltas_jour.xlsx', 'jourtid')]
+        for intervals, filename, when in deltas:
+            path = os.path.join(self.xlsx_dir, filename)
+            refresh(self.outputs, path, export_table, path, self.turnaround(intervals),
+                    'Tid (i timmar) det tar för att svara på akuta remisser {}. '
+                    'Endast remisser besvarade inom 24 timmar räknas.'.format(when))
+
+        if self.delta_sketches or self.chunksize is not None:
+            for intervals, filename in [(DAG, 'tid_kvantiler_dag.xlsx'), (JOUR, 'tid_kvantiler_jour.xlsx')]:
+                path = os.path.join(self.xlsx_dir, filename)
+                refresh(self.outputs, path, export_table, path,
+                        sketch_quantiles(self.sketch, ['year', 'month', 'weekday'], interval_svarad=intervals),
+                        None, False)
+        save_manifest(self.outputs, self.manifest_path)
+
+    @step
+    def write_backlog(self):
+        from .export import export_table
+        os.makedirs(self.xlsx_dir, exist_ok=True)
+        path = os.path.join(self.xlsx_dir, 'köer_per_intervall.xlsx')
+        refresh(self.outputs, path, export_table, path, self.backlog,
+                'Största och genomsnittligt antal obesvarade akuta remisser per minut. Remisser utan svar räknas inte.',
+                False)
+        save_manifest(self.outputs, self.manifest_path)
+
+    @stage()
+    def figures(self) -> list:
+        """The plot jobs, each (plot function, args, kwargs), see plots.render"""
+        if not self.years:
+            # Inga besvarade remisser i perioden, inget att rita.
+            return []
+        # matplotlib laddas bara när figurer faktiskt ritas.
+        from .plots import (per_year_counts_barplot, per_year_modality_counts_barplot, counts_per_month_boxplot,
+                            counts_per_weekday_boxplot, timedelta_boxplot, counts_per_month_and_year_heatmap)
+        t = self.table
+        y = {'years': self.years}
+        grids = self.calendar_grids()
+        # Svarstiden per remiss finns inte när dump läses i delar.
+        deltas = [] if self.chunksize is not None else [
+            (timedelta_boxplot, (self.deltas(DAG), 'Tidsinterval, akuta remisser besvarade inom 24t, dag'), y),
+            (timedelta_boxplot, (self.deltas(JOUR), 'Tidsinterval, akuta remisser besvarade inom 24t, jour'), y)
+        ]
+        return [
+            (per_year_counts_barplot, (t('dag_alla_skapade'),
+                                       'Akuta remisser skapade 07.30 - 16.00 (alla modaliteter)'), y),
+            (per_year_counts_barplot, (t('dag_alla_svarade'),
+                                       'Akuta remisser besvarade 07.30 - 16.00 (alla modaliteter)'), y),
+            (per_year_counts_barplot, (t('jour_alla_skapade'),
+                                       'Akuta remisser skapade 16.00 - 07.30 (alla modaliteter)'), y),
+            (per_year_counts_barplot, (t('jour_alla_svarade'),
+                                       'Akuta remisser besvarade 16.00 - 07.30 (alla modaliteter)'), y),
+            (per_year_counts_barplot, (t('sen_jour_alla_skapade'),
+                                       'Akuta remisser skapade 00.00 - 07.30 (alla modaliteter)'), y),
+            (per_year_counts_barplot, (t('sen_jour_alla_svarade'),
+                                       'Akuta remisser besvarade 00.00 - 07.30 (alla modaliteter)'), y),
+            (per_year_modality_counts_barplot, (t('jour_skapade'), 'Akuta remisser skapade 16.00 - 07.30'), y),
+            (per_year_modality_counts_barplot, (t('jour_svarade'), 'Akuta remisser besvarade 16.00 - 07.30'), y),
+            (per_year_modality_counts_barplot, (t('sen_jour_skapade'), 'Akuta remisser skapade 00.00 - 07.30'), y),
+            (per_year_modality_counts_barplot, (t('sen_jour_svarade'), 'Akuta remisser besvarade 00.00 - 07.30'), y),
+            (per_year_modality_counts_barplot, (t('ej_jour_skapade'), 'Akuta remisser skapade 07.30 - 16.00'), y),
+            (counts_per_month_boxplot, (grids['_b_dag_by_month'], 'Akuta besvarade remisser per månad, dag'), {}),
+            (counts_per_month_boxplot, (grids['_b_jour_by_month'], 'Akuta besvarade remisser per månad, jour'), {}),
+            (counts_per_weekday_boxplot, (grids['_b_dag_by_weekday'], 'Akuta besvarade remisser per veckodag, dag'),
+             {}),
+            (counts_per_weekday_boxplot, (grids['_b_jour_by_weekday'],
+                                          'Akuta besvarade remisser per veckodag, jour'), {}),
+            *deltas,
+            (counts_per_month_and_year_heatmap, (grids['_b_dag_by_month'],),
+             dict(title='Normaliserat antal akuta besvarade remisser per månad och år, dag', **y)),
+            (counts_per_month_and_year_heatmap, (grids['_b_jour_by_month'],),
+             dict(title='Normaliserat antal akuta besvarade remisser per månad och år, jour', **y)),
+            (counts_per_month_and_year_heatmap, (grids['_s_dag_by_month'],),
+             dict(title='Normaliserat antal akuta skapade remisser per månad och år, dag', **y)),
+            (counts_per_month_and_year_heatmap, (grids['_s_jour_by_month'],),
+             dict(title='Normaliserat antal akuta skapade remisser per månad och år, jour', **y)),
+            (counts_per_month_and_year_heatmap, (grids['_b_jour_by_month'],),
+             dict(normalize_by=grids['_s_jour_by_month'],
+                  title='Antal besvarade remisser normalizerat med antal skapade i samma period, jour',
+                  **y))
+        ]
+
+    @step
+    def render_figures(self, processes: int = None) -> int:
+        """Draw the figures that are missing or out of date, returning how many were drawn"""
+        from .plots import render
+        os.makedirs(self.figures_dir, exist_ok=True)
+        n = render(self.figures, self.figures_dir, processes=processes, manifest=self.outputs)
+        save_manifest(self.outputs, self.manifest_path)
+        return n
@@ -0,0 +1,212 @@
+"""Figures of the analysis.
+
+Every plot function draws one figure from a small pre-aggregated table, saves it as a png in figures_dir and closes
+it. render runs a list of plot jobs in a process pool on the headless Agg backend, skipping figures whose inputs
+have not changed since they were last drawn (see manifest.py).
+"""
+
+import os
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap
+import numpy as np
+from pandas import DataFrame
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence
+
+from .features import days, months
+from .manifest import content_hash, is_stale, record
+
+
+def _save(fig, title: str, figures_dir: str):
+    fig.savefig(os.path.join(figures_dir, '{}.png'.format(title)), dpi=600)
+    plt.close(fig)
+
+
+def _per_year(dfm: DataFrame, years: list) -> np.ndarray:
+    # Antal per år i years, 0 för år utan remisser.
+    return dfm.set_index('year')['antal'].reindex(years, fill_value=0).values
+
+
+def per_year_counts_barplot(dfm: DataFrame, title: str, years: list, figures_dir: str):
+    plt.style.use('seaborn')
+    ind = np.arange(len(years))
+    bar_width = 0.32
+    fig, ax = plt.subplots()
+    ax.set_title(title)
+    ax.set_xticks(ind)
+    ax.set_xticklabels(years)
+    ax.set_xlabel('År')
+    ax.set_ylabel('Antal')
+    ymax = dfm.antal.max()
+    ax.set_ylim(0, ymax + ymax*0.2)  # Set y limit higher so that labels don't overlap legend
+
+    ax.bar(ind - bar_width/2, _per_year(dfm, years), bar_width)
+
+    # Add counts
+    for rect in ax.patches:
+        h = rect.get_height()
+        ax.text(rect.get_x() + rect.get_width()/2., h + 200, '%d' % h, ha='center', va='bottom', rotation=90)
+
+    # Make room for xlabel otherwise it is clipped when saving to png
+    fig.subplots_adjust(bottom=0.15)
+
+    _save(fig, title, figures_dir)
+
+
+def per_year_modality_counts_barplot(dfm: DataFrame, title: str, years: list, figures_dir: str):
+    plt.style.use('seaborn')
+    # DT, Rtg, Ulj och Glys i den ordningen, därefter övriga modaliteter i tabellen.
+    order = ['DT', 'Rtg', 'Ulj', 'Glys']
+    present = set(dfm.modalitet)
+    modalities = [m for m in order if m in present] + sorted(present - set(order))
+
+    ind = np.arange(len(years))
+    bar_width = min(0.24, 0.96 / max(len(modalities), 1))
+    fig, ax = plt.subplots()
+    ax.set_title(title)
+    ax.set_xticks(ind)
+    ax.set_xticklabels(years)
+    ax.set_xlabel('År')
+    ax.set_ylabel('Antal')
+    ymax = dfm.antal.max()
+    ax.set_ylim(0, ymax + ymax*0.3)  # Set y limit higher so that labels don't overlap legend
+
+    # Make the bar plot rectangles
+    for i, m in enumerate(modalities):
+        ax.bar(ind + bar_width*(i - 0.5), _per_year(dfm[dfm.modalitet == m], years), bar_width, label=m)
+
+    ax.legend(ncol=max(len(modalities), 1))
+
+    # Add counts
+    for rect in ax.patches:
+        h = rect.get_height()
+        ax.text(rect.get_x() + rect.get_width()/2., h + 200, '%d' % h, ha='center', va='bottom', rotation=90)
+
+    # Make room for xlabel otherwise it is clipped when saving to png
+    fig.subplots_adjust(bottom=0.15)
+
+    _save(fig, title, figures_dir)
+
+
+def counts_per_month_boxplot(grid: np.ma.MaskedArray, title: str, figures_dir: str):
+    """grid holds the counts per year and month (see cube.calendar_grid), one box per month"""
+    plt.style.use('seaborn')
+    values = [grid[:, j].compressed() for j in range(grid.shape[1])]
+    fig, ax = plt.subplots()
+    plt.boxplot(values, showfliers=True)
+    ax.set_xticklabels(months)
+    ax.set_xlabel('Månad')
+    ax.set_ylabel('Antal')
+    ax.set_title(title)
+    _save(fig, title, figures_dir)
+
+
+def counts_per_weekday_boxplot(grid: np.ma.MaskedArray, title: str, figures_dir: str):
+    """grid holds the counts per year and weekday (see cube.calendar_grid), one box per weekday"""
+    plt.style.use('seaborn')
+    values = [grid[:, j].compressed() for j in range(grid.shape[1])]
+    fig, ax = plt.subplots()
+    plt.boxplot(values, showfliers=True)
+    ax.set_xticklabels(days)
+    ax.set_xlabel('Veckodag')
+    ax.set_ylabel('Antal')
+    ax.set_title(title)
+    _save(fig, title, figures_dir)
+
+
+def timedelta_boxplot(df: DataFrame, title: str, years: list, figures_dir: str):
+    plt.style.use('seaborn')
+    values = [df[df['year'] == y]['delta_t'].values for y in years]
+    fig, ax = plt.subplots()
+    plt.boxplot(values, showfliers=True)
+    ax.set_xticklabels(years)
+    ax.set_xlabel('År')
+    ax.set_ylabel('Timmar')
+    ax.set_title(title)
+    _save(fig, title, figures_dir)
+
+
+def counts_per_month_and_year_heatmap(grid: np.ma.MaskedArray, normalize_by: np.ma.MaskedArray = None,
+                                      title: str = "", years: list = None, figures_dir: str = '.'):
+    """Draw one row per year and one column per month of grid (see cube.calendar_grid). Months outside the period of
+    the dump are masked: they are left blank and do not count towards the mean and SD."""
+    plt.style.use('seaborn-dark')
+    if normalize_by is None:
+        # normalize by mean and std
+        normalized = (grid - grid.mean()) / grid.std(ddof=1)
+    else:
+        normalized = np.ma.divide(grid, normalize_by)
+
+    m = np.ma.round(normalized, decimals=2)
+
+    colors = [(0.3, 0.3, 1.), (0.3, 1., 1.), (0.3, 1., 0.3), (1., 1., 0.3), (1., 0.3, 0.3)]  # rgb
+    cm = LinearSegmentedColormap.from_list('my_colormap', colors)
+    threshold = m.max()
+    fig, ax = plt.subplots()
+    h = ax.imshow(m, interpolation='nearest', vmax=threshold, cmap=cm)
+    ax.set_xticks(np.arange(len(months)))
+    ax.set_yticks(np.arange(len(years)))
+    ax.set_xticklabels(months)
+    ax.set_yticklabels(years)
+
+    # Rotate and align tick labels.
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right', rotation_mode='anchor')
+
+    # Text annotations.
+    for i, j in zip(*np.nonzero(~np.ma.getmaskarray(m))):
+        ax.text(j, i, m[i, j], ha='center', va='center', color='black')
+
+    # Show colorbar
+    values_range = [m.min(), 0.00, m.max()] if m.min() < 0 < m.max() else [m.min(), m.max()]
+    cbar = plt.colorbar(h)
+    cbar.set_ticks(values_range)
+    cbar.set_ticklabels(values_range)
+
+    ax.set_title(title)
+    fig.tight_layout()
+    _save(fig, title, figures_dir)
+
+
+def _run(job: tuple, figures_dir: str):
+    fn, args, kwargs = job
+    fn(*args, figures_dir=figures_dir, **kwargs)
+
+
+def output_path(job: tuple, figures_dir: str) -> str:
+    """Return the path of the png a plot job draws"""
+    fn, args, kwargs = job
+    title = inspect.signature(fn).bind_partial(*args, **kwargs).arguments['title']
+    return os.path.join(figures_dir, '{}.png'.format(title))
+
+
+def render(jobs: Sequence[tuple], figures_dir: str, processes: int = None, manifest: dict = None) -> int:
+    """Render plot jobs, each a tuple (plot function, args, kwargs), into figures_dir.
+
+    Jobs run in a pool of processes worker processes (default: one per core). With processes=1 they run in this
+    process, one after another. Given a manifest, only figures that are missing or whose plot function or inputs
+    have changed are drawn, and the manifest is updated with the new hashes. Returns the number of figures drawn.
+    """
+    pending = []
+    for job in jobs:
+        digest = None
+        if manifest is not None:
+            digest = content_hash(*job)
+            if not is_stale(manifest, output_path(job, figures_dir), digest):
+                continue
+        pending.append((job, digest))
+
+    if processes == 1:
+        for job, _ in pending:
+            _run(job, figures_dir)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for f in [pool.submit(_run, job, figures_dir) for job, _ in pending]:
+                f.result()
+
+    if manifest is not None:
+        for job, digest in pending:
+            record(manifest, output_path(job, figures_dir), digest)
+    return len(pending)
@@ -0,0 +1,171 @@
+"""Local HTTP/JSON queries over an aggregates store (see incremental.py).
+
+    python -m remissfl.serve aggregat.sqlite [--host 127.0.0.1] [--port 8765]
+
+The count cubes and the turnaround sketch of the store are loaded into memory once, so a query is a filter and a sum
+over the cube (cube.cube_counts) or over the sketch (turnaround.sketch_quantiles) and takes milliseconds. Answers are
+cached per query until the store changes on disk, e.g. after the nightly ingest, when it is loaded again. Only the
+standard library's http.server is used and by default the service only listens on the local host.
+
+    GET /                        dimensions and their values
+    GET /counts?cube=svarade&by=weekday&year=2017&modalitet=Ulj&interval_svarad=5
+    GET /turnaround?by=year,month&interval_svarad=1,2&q=0.5,0.9
+    GET /tables/jour_svarade     a table of pipeline.TABLES
+
+Filters and by may use the date attributes year, month, day, weekday, date and datum, 'modalitet' and the intervals
+('interval_svarad' only for turnaround); several values are separated by commas. /counts over the answered cube
+('svarade', default) or the created cube ('skapade'). /turnaround takes the quantiles in q (default 0.5, 0.9, 0.95)
+and counts only referrals answered within 24 hours unless within_24h=0.
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List, Tuple
+
+from .cube import AXES, DATE_ATTRIBUTES, cube_counts
+from .incremental import load_cubes, load_sketch
+from .pipeline import TABLES, YEARS, CHOSEN_MODALITIES, MODALITETER
+from .turnaround import sketch_quantiles, with_calendar
+
+
+# Dimensioner med textvärden, övriga filtervärden är tal.
+TEXT_DIMENSIONS = ('modalitet', 'datum')
+
+# Dimensioner som kan grupperas och filtreras på, per sökväg.
+DIMENSIONS = {
+    '/counts': DATE_ATTRIBUTES + AXES[1:],
+    '/turnaround': DATE_ATTRIBUTES + ('modalitet', 'interval_svarad')
+}
+
+
+def _values(name: str, text: str) -> list:
+    values = [v for v in text.split(',') if v != '']
+    return values if name in TEXT_DIMENSIONS else [float(v) if '.' in v else int(v) for v in values]
+
+
+def parse_query(query: str) -> Tuple[Dict[str, List[str]], Dict[str, list]]:
+    """Split a query string into its options (by, cube, q, within_24h) and its filters"""
+    options, filters = {}, {}
+    for name, texts in parse_qs(query, keep_blank_values=True).items():
+        text = ','.join(texts)
+        if name in ('by', 'cube', 'q', 'within_24h'):
+            options[name] = [v for v in text.split(',') if v != '']
+        else:
+            filters[name] = _values(name, text)
+    return options, filters
+
+
+class Store:
+    """The cubes and sketch of an aggregates store, reloaded when the file changes, and the cached answers"""
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        self.path = path
+        self.cache_size = cache_size
+        self.mtime = None
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime != self.mtime:
+            svarade, skapade = load_cubes(self.path)
+            self.cubes = {'svarade': svarade, 'skapade': skapade}
+            self.sketch = with_calendar(load_sketch(self.path))
+            self.years = sorted(int(y) for y in svarade.calendar['year'].unique())
+            self.cache.clear()
+            self.mtime = mtime
+
+    def answer(self, path: str, query: str) -> Tuple[str, bool]:
+        """Return the JSON answer to a request and whether it came from the cache"""
+        options, filters = parse_query(query)
+        key = (path, tuple(sorted((k, tuple(v)) for k, v in options.items())),
+               tuple(sorted((k, tuple(v)) for k, v in filters.items())))
+        with self.lock:
+            self._load()
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key], True
+            body = self._query(path, options, filters)
+            self.cache[key] = body
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return body, False
+
+    def _query(self, path: str, options: dict, filters: dict) -> str:
+        by = options.get('by', [])
+        if path == '/':
+            calendar = self.cubes['svarade'].calendar
+            return json.dumps({'cubes': list(self.cubes), 'year': self.years,
+                               'modalitet': list(self.cubes['svarade'].modalities),
+                               'interval': [int(i) for i in self.cubes['svarade'].intervals[1:]],
+                               'first': calendar['datum'].min(), 'last': calendar['datum'].max(),
+                               'date_attributes': list(DATE_ATTRIBUTES)}, ensure_ascii=False)
+        if path in DIMENSIONS:
+            unknown = (set(by) | set(filters)) - set(DIMENSIONS[path])
+            if unknown:
+                raise ValueError('Okänd dimension: {}'.format(', '.join(sorted(unknown))))
+        if path == '/counts':
+            table = cube_counts(self.cubes[options.get('cube', ['svarade'])[0]], by, **filters)
+        elif path == '/turnaround':
+            quantiles = [float(q) for q in options.get('q', ['0.5', '0.9', '0.95'])]
+            within_24h = options.get('within_24h', ['1'])[0] not in ('0', 'false')
+            table = sketch_quantiles(self.sketch, by, quantiles, within_24h, **filters)
+        elif path.startswith('/tables/') and path[len('/tables/'):] in TABLES:
+            cube, by, fixed = TABLES[path[len('/tables/'):]]
+            resolved = {YEARS: self.years, CHOSEN_MODALITIES: MODALITETER}
+            fixed = {k: resolved[v] if isinstance(v, str) else v for k, v in fixed.items()}
+            table = cube_counts(self.cubes[cube], by, **fixed)
+        else:
+            raise LookupError(path)
+        return table.to_json(orient='records', force_ascii=False)
+
+
+class Handler(BaseHTTPRequestHandler):
+    store: Store = None
+
+    def _send(self, status: int, body: str, cached: bool = False):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Cache', 'hit' if cached else 'miss')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            body, cached = self.store.answer(url.path.rstrip('/') or '/', url.query)
+        except LookupError:
+            self._send(404, json.dumps({'fel': 'okänd sökväg eller kub: {}'.format(self.path)}, ensure_ascii=False))
+        except (ValueError, TypeError) as e:
+            self._send(400, json.dumps({'fel': str(e)}, ensure_ascii=False))
+        else:
+            self._send(200, body, cached)
+
+
+def serve(store: str, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """Return a server answering queries over store (call serve_forever() on it)"""
+    handler = type('StoreHandler', (Handler,), {'store': Store(store)})
+    handler.store.answer('/', '')
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Frågor mot sparade räkningar över HTTP/JSON.')
+    parser.add_argument('store', help='SQLite-fil med sparade räkningar (se incremental.py)')
+    parser.add_argument('--host', default='127.0.0.1', help='adress att lyssna på (standard 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='port (standard 8765)')
+    args = parser.parse_args()
+    server = serve(args.store, args.host, args.port)
+    print('Svarar på http://{}:{}/ med räkningar från {}.'.format(args.host, args.port, args.store))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
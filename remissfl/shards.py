@@ -0,0 +1,84 @@
+"""Aggregation of the acute referrals in shards, by site, ordering unit or year, in a pool of processes.
+
+The count cubes and the turnaround sketch are sums over referrals, so the referrals can be split into disjoint
+shards, aggregated independently and merged by adding the parts (merge_cubes, merge_sketches) without changing any
+count. Every shard is classified, given its intervals and counted into cubes and a sketch in a worker process; the
+merged result is the same as for the unsplit dump, and each shard's own result gives its per-shard report.
+
+A referral belongs to exactly one shard: the site is lab_vardenhet, the unit bestalld_från_vårdenhet_id and the
+year that of bestallningstidpunkt (or of svar_mottogs when the order time is missing). Referrals without a value
+form the shard 'okänd'.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from pandas import DataFrame, Series
+from typing import Dict, Iterable, NamedTuple, Sequence
+
+from .cube import Cube, build_cube, merge_cubes
+from .features import interval_codes, INTERVAL_BOUNDARIES
+from .modality import assign_modality, classify_cached
+from .turnaround import build_sketch, merge_sketches
+
+
+# Indelning -> kolumn i dump som avgör vilken del en remiss hör till.
+SHARDS = {
+    'site': 'lab_vardenhet',
+    'unit': 'bestalld_från_vårdenhet_id',
+    'year': 'bestallningstidpunkt'
+}
+
+OKAND = 'okänd'
+
+
+class Shard(NamedTuple):
+    svarade: Cube
+    skapade: Cube
+    sketch: DataFrame
+    rows: int
+
+
+def shard_keys(df: DataFrame, by: str) -> Series:
+    """Return the shard of every row of df as a string"""
+    if by == 'year':
+        year = df['bestallningstidpunkt'].dt.year.fillna(df['svar_mottogs'].dt.year)
+        return year.astype('Int64').astype(str).where(year.notna(), OKAND)
+    column = df[SHARDS[by]]
+    return column.astype(object).where(column.notna(), OKAND).astype(str)
+
+
+def count(acute: DataFrame, modalitet: Series, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> Shard:
+    """Count the classified acute referrals into cubes and a turnaround sketch"""
+    rows = acute.assign(modalitet=modalitet,
+                        interval_skapad=interval_codes(acute.bestallningstidpunkt, boundaries),
+                        interval_svarad=interval_codes(acute.svar_mottogs, boundaries))
+    return Shard(build_cube(rows, 'svar_mottogs', boundaries), build_cube(rows, 'bestallningstidpunkt', boundaries),
+                 build_sketch(rows), len(rows))
+
+
+def aggregate(acute: DataFrame, cache_path: str = None, boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> Shard:
+    """Classify the acute referrals and count them into cubes and a turnaround sketch"""
+    return count(acute, assign_modality(acute.undersokning, cache_path=cache_path)[0], boundaries)
+
+
+def run_shards(parts: Dict[str, DataFrame], processes: int = None, cache_path: str = None,
+               boundaries: Sequence[int] = INTERVAL_BOUNDARIES) -> Dict[str, Shard]:
+    """Aggregate every part in a pool of processes worker processes (default: one per core).
+
+    With processes=1 the parts are aggregated in this process, one after another.
+    """
+    if processes == 1:
+        return {key: aggregate(part, cache_path, boundaries) for key, part in parts.items()}
+    if cache_path is not None:
+        # Nya strängar klassas här en gång, så att arbetarna endast läser cachen och inte skriver till den samtidigt.
+        classify_cached(set().union(*(part.undersokning.dropna().unique() for part in parts.values())), cache_path)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {key: pool.submit(aggregate, part, cache_path, boundaries) for key, part in parts.items()}
+        return {key: f.result() for key, f in futures.items()}
+
+
+def merge_shards(shards: Iterable[Shard]) -> Shard:
+    """Add the cubes and sketches of the shards"""
+    shards = list(shards)
+    return Shard(reduce(merge_cubes, [s.svarade for s in shards]), reduce(merge_cubes, [s.skapade for s in shards]),
+                 merge_sketches(*[s.sketch for s in shards]), sum(s.rows for s in shards))
@@ -0,0 +1,60 @@
+"""Chunked processing of dumps that do not fit in memory.
+
+The CSV is read in chunks. The acute referrals of each chunk are classified and counted into the same count cubes
+and turnaround sketch as the in-memory analysis (see shards.count), together with the number of referrals per
+distinct 'undersokning' string for the coverage checks. All of these are sums, so the chunks are merged by adding
+them (cube.merge_cubes, turnaround.merge_sketches) and every table in pipeline.TABLES comes out the same as from the
+whole dump. Peak memory is bounded by the chunk size and the number of days and distinct strings rather than by the
+number of rows.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Index, Series
+from typing import Callable, Iterable, NamedTuple, Sequence
+
+from .features import INTERVAL_BOUNDARIES
+from .modality import assign_modality
+from .shards import Shard, count, merge_shards
+
+
+class Streamed(NamedTuple):
+    rows: int  # antal rader i dump
+    totals: Shard  # kuber och skiss för alla akuta remisser
+    strings: Series  # antal akuta remisser per sträng, flest först (som coverage.string_counts)
+    classes: DataFrame  # klassningen av varje sträng (som modality.classify_unique)
+
+
+def stream_aggregate(chunks: Iterable[DataFrame], acute: Callable[[DataFrame], DataFrame], cache_path: str = None,
+                     boundaries: Sequence[int] = INTERVAL_BOUNDARIES,
+                     progress: Callable[[int], None] = None) -> Streamed:
+    """Count the acute referrals of every chunk of the dump and add the counts up.
+
+    acute selects the acute referrals of a chunk, e.g. pipeline.Analysis.acute_rows. Strings are classified chunk by
+    chunk through assign_modality, so with cache_path every distinct string is classified only once. progress is
+    called with the number of rows read so far after every chunk.
+    """
+    rows, totals, classes = 0, None, None
+    strings, antal = Index([], dtype=object), np.zeros(0, dtype='int64')
+    for chunk in chunks:
+        rows += len(chunk)
+        part = acute(chunk)
+        modalitet, table = assign_modality(part.undersokning, cache_path=cache_path)
+        counted = count(part, modalitet, boundaries)
+        totals = counted if totals is None else merge_shards([totals, counted])
+        # Endast strängar som inte klassats i tidigare delar läggs till, så att tabellen inte växer med delarna.
+        classes = table if classes is None else pd.concat([classes, table[~table.index.isin(classes.index)]])
+
+        # Strängarna hålls i den ordning de först förekommer, så att lika många remisser sorteras som i
+        # string_counts över hela dump.
+        codes, uniques = pd.factorize(part.undersokning, use_na_sentinel=False)
+        uniques = Index(np.asarray(uniques, dtype=object))
+        strings = strings.append(uniques[~uniques.isin(strings)])
+        antal = np.append(antal, np.zeros(len(strings) - len(antal), dtype='int64'))
+        antal[strings.get_indexer(uniques)] += np.bincount(codes, minlength=len(uniques))
+        if progress is not None:
+            progress(rows)
+
+    order = np.argsort(-antal, kind='stable')
+    counts = Series(antal[order], index=Index(strings[order], name='undersokning'), name='antal')
+    return Streamed(rows, totals, counts, DataFrame() if classes is None else classes)
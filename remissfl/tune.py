@@ -0,0 +1,113 @@
+"""Interactive tuning of the modality selectors.
+
+    python -m remissfl.tune <dump> <selektorer.toml|.yaml> [--once] [--top N]
+
+The acute referrals of the dump are loaded once and only their distinct 'undersokning' strings and counts are kept.
+The selector file (see modality.load_selectors) is then watched: every time it is saved the strings are classified
+with the new selectors and the strings that changed modality since the previous version are listed, together with
+the number of referrals that moved. Only selectors whose pattern changed are searched again, so feedback comes well
+within a second. A missing selector file is created with the built-in selectors to start from.
+"""
+
+import os
+import sys
+import time
+import argparse
+from pandas import DataFrame, Series
+
+from .ingest import load_dump, merge_acute
+from .modality import SELECTORS, classify_unique, load_selectors
+from .coverage import string_counts
+
+
+def acute_string_counts(dump: str) -> Series:
+    """Return the number of acute referrals per distinct 'undersokning' string in the dump"""
+    df = load_dump(dump, columns=['prioritet', 'akut', 'undersokning'])
+    return string_counts(df.undersokning[merge_acute(df) == 1.0].dropna())
+
+
+def write_selectors(path: str, selectors: dict):
+    """Write selectors to a TOML or YAML file that load_selectors can read"""
+    if os.path.splitext(path)[1].lower() == '.toml':
+        with open(path, 'w', encoding='utf-8') as f:
+            for name, pattern in selectors.items():
+                # Literal strings, så att regexarnas bakstreck inte behöver escapas.
+                quote = "'''" if "'" in pattern else "'"
+                f.write('{} = {}{}{}\n'.format(name, quote, pattern, quote))
+    else:
+        import yaml
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(dict(selectors), f, allow_unicode=True, sort_keys=False, width=1000)
+
+
+def membership_diff(old: DataFrame, new: DataFrame, counts: Series) -> DataFrame:
+    """Return the strings whose modality differs between two classification tables, most referrals first"""
+    moved = old.modalitet.to_numpy() != new.modalitet.to_numpy()
+    diff = DataFrame({'undersokning': old.index[moved], 'från': old.modalitet.to_numpy()[moved],
+                      'till': new.modalitet.to_numpy()[moved], 'antal': counts.to_numpy()[moved]})
+    return diff.sort_values('antal', ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+def print_diff(diff: DataFrame, new: DataFrame, counts: Series, top: int = 20):
+    if diff.empty:
+        print('Inga strängar bytte modalitet.')
+    else:
+        print('{} strängar i {} remisser bytte modalitet:'.format(len(diff), diff.antal.sum()))
+        moves = diff.groupby(['från', 'till']).agg(strängar=('antal', 'size'), remisser=('antal', 'sum'))
+        print(moves.sort_values('remisser', ascending=False).to_string())
+        print('\nFlest remisser:')
+        print(diff.head(top).to_string(index=False))
+    per_modality = Series(counts.to_numpy(), index=new.modalitet.to_numpy()).groupby(level=0).sum()
+    print('\nRemisser per modalitet: ' + ', '.join('{} {}'.format(m, n) for m, n in per_modality.items()))
+
+
+def watch(dump: str, path: str, once: bool = False, top: int = 20, interval: float = 0.2):
+    """Classify the strings of dump with the selectors in path, and again with every saved version of the file"""
+    t = time.perf_counter()
+    counts = acute_string_counts(dump)
+    strings = counts.index.tolist()
+    print('Läste {} unika strängar i {} akuta remisser på {:.1f} s.'
+          .format(len(strings), counts.sum(), time.perf_counter() - t))
+
+    if not os.path.exists(path):
+        write_selectors(path, SELECTORS)
+        print('Skrev de inbyggda selektorerna till {}.'.format(path))
+
+    memo = {}
+    table = classify_unique(strings, memo=memo)
+    mtime = None
+    while True:
+        current = os.path.getmtime(path)
+        if current != mtime:
+            mtime = current
+            t = time.perf_counter()
+            try:
+                selectors = load_selectors(path)
+                new = classify_unique(strings, selectors, memo)
+            except Exception as e:
+                # Ett halvfärdigt regex ska inte avbryta sessionen.
+                print('\nKunde inte läsa {}: {}'.format(path, e))
+            else:
+                print('\n--- {} ({:.0f} ms) ---'.format(time.strftime('%H:%M:%S'), (time.perf_counter() - t) * 1000))
+                print_diff(membership_diff(table, new, counts), new, counts, top=top)
+                table = new
+                # Glöm sökningar med mönster som inte längre används.
+                keep = set(selectors.items()) | set(SELECTORS.items())
+                for key in [k for k in memo if k not in keep]:
+                    del memo[key]
+            if once:
+                return table
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Justera modalitetsselektorerna med omedelbar återkoppling.')
+    parser.add_argument('dump', help='RIS-dump (CSV)')
+    parser.add_argument('selectors', help='fil med selektorer (.toml, .yaml eller .yml)')
+    parser.add_argument('--once', action='store_true', help='jämför filen med de inbyggda selektorerna och avsluta')
+    parser.add_argument('--top', type=int, default=20, help='antal strängar som listas (standard 20)')
+    args = parser.parse_args()
+    try:
+        watch(args.dump, args.selectors, once=args.once, top=args.top)
+    except KeyboardInterrupt:
+        sys.exit(0)
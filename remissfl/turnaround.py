@@ -0,0 +1,162 @@
+"""Turnaround times, from 'bestallningstidpunkt' to 'svar_mottogs'.
+
+Times are computed as int64 nanosecond differences of the two timestamp columns. describe_turnaround gives the same
+statistics as groupby(by).describe() on the hours, from one sort of the nanoseconds instead of a pass per group.
+
+For statistics that must be updated or combined without the individual times there are sketches: the answered
+referrals are counted per (date, modalitet, interval_svarad) cell in fixed one-minute bins of turnaround time. Every
+sketch uses the same bins, so sketches from different extracts, periods or hospitals are merged by adding the counts
+of equal cells and bins, and quantiles are read from the merged counts. Quantiles from a sketch are accurate to
+within a minute for times under 24 hours. Negative times count as the minute before zero and times of 24 hours or
+more share one overflow bin.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from typing import Sequence, Tuple
+
+from .features import NS_PER_MINUTE, calendar_columns, date_strings
+
+
+STATISTICS = ('count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max')
+
+# Minutbinnar 0..N_BINS-1, -1 för negativa tider och N_BINS för 24 timmar eller mer.
+N_BINS = 24 * 60
+
+SKETCH_KEYS = ('date', 'modalitet', 'interval_svarad')
+
+
+def turnaround_ns(df: DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Return svar_mottogs - bestallningstidpunkt in nanoseconds, with a boolean mask of rows where both are set"""
+    start = df['bestallningstidpunkt'].to_numpy(dtype='datetime64[ns]')
+    end = df['svar_mottogs'].to_numpy(dtype='datetime64[ns]')
+    present = ~(np.isnat(start) | np.isnat(end))
+    return np.where(present, end.view('int64') - start.view('int64'), 0), present
+
+
+def turnaround_hours(df: DataFrame) -> Series:
+    """Return the turnaround time of every row in hours, NaN where a timestamp is missing"""
+    ns, present = turnaround_ns(df)
+    # Sekunder först, så att värdena blir identiska med Timedelta.total_seconds() / 3600.
+    hours = np.where(present, ns / 1e9 / 3600.0, np.nan)
+    return Series(hours, index=df.index, name='delta_t')
+
+
+def describe_turnaround(df: DataFrame, by: Sequence[str], within: pd.Timedelta = None) -> DataFrame:
+    """Return count, mean, std, min, quartiles and max of the turnaround time in hours per group.
+
+    The frame has the same layout as df.groupby(by)[['delta_t']].describe(). Rows with a missing timestamp are left
+    out, and so are rows slower than within if it is given. Minimum, maximum and quartiles are taken from the sorted
+    nanosecond differences.
+    """
+    ns, present = turnaround_ns(df)
+    if within is not None:
+        present &= ns <= within.value
+    rows = df.loc[present, list(by)]
+    ns = ns[present]
+
+    g = rows.groupby(list(by), sort=True)
+    codes = g.ngroup().to_numpy()
+    index = g.size().index
+    order = np.lexsort((ns, codes))
+    sorted_ns = ns[order]
+    n = np.bincount(codes, minlength=len(index))
+    start = np.concatenate([[0], np.cumsum(n)[:-1]])
+
+    hours = sorted_ns / 1e9 / 3600.0
+    mean = np.add.reduceat(hours, start) / n if len(hours) else np.zeros(0)
+    squares = np.add.reduceat((hours - np.repeat(mean, n)) ** 2, start) if len(hours) else np.zeros(0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(squares / (n - 1))
+
+    def quantile(q: float) -> np.ndarray:
+        # Linjär interpolation mellan närmaste värden, som i pandas.
+        pos = (n - 1) * q
+        lo = np.floor(pos).astype('int64')
+        hi = np.minimum(lo + 1, n - 1)
+        a = sorted_ns[start + lo].astype(float)
+        b = sorted_ns[start + hi].astype(float)
+        return (a + (b - a) * (pos - lo)) / 1e9 / 3600.0
+
+    stats = [n.astype(float), mean, std, quantile(0.0), quantile(0.25), quantile(0.5), quantile(0.75),
+             quantile(1.0)]
+    columns = pd.MultiIndex.from_product([['delta_t'], STATISTICS])
+    return DataFrame(np.column_stack(stats), index=index, columns=columns)
+
+
+def delta_bins(ns: np.ndarray) -> np.ndarray:
+    """Return the sketch bin of every turnaround time in nanoseconds"""
+    return np.clip(np.floor_divide(ns, NS_PER_MINUTE), -1, N_BINS).astype('int16')
+
+
+def build_sketch(df: DataFrame) -> DataFrame:
+    """Count the answered rows of df per sketch cell and bin.
+
+    df needs the timestamp columns, 'modalitet' and 'interval_svarad'. Returns a sparse frame with the columns
+    date (yyyymmdd of svar_mottogs), modalitet, interval_svarad, bin and antal.
+    """
+    ns, present = turnaround_ns(df)
+    rows = df[present]
+    date = calendar_columns(rows['svar_mottogs'])['date']
+    cells = DataFrame({'date': np.asarray(date, dtype='int64'),
+                       'modalitet': np.asarray(rows['modalitet'], dtype=object),
+                       'interval_svarad': rows['interval_svarad'].to_numpy(dtype=float, na_value=np.nan),
+                       'bin': delta_bins(ns[present])})
+    return cells.groupby(list(SKETCH_KEYS) + ['bin']).size().reset_index(name='antal')
+
+
+def merge_sketches(*sketches: DataFrame) -> DataFrame:
+    """Merge sketches by adding the counts of equal cells and bins"""
+    merged = pd.concat(sketches, ignore_index=True)
+    return merged.groupby(list(SKETCH_KEYS) + ['bin'])['antal'].sum().reset_index()
+
+
+def with_calendar(sketch: DataFrame) -> DataFrame:
+    """Add the date attributes year, month, day, weekday and datum of the answer date to the cells of a sketch"""
+    days = pd.to_datetime(sketch['date'].astype(str), format='%Y%m%d')
+    return sketch.assign(**calendar_columns(days).drop(columns='date'), datum=date_strings(days))
+
+
+def sketch_quantiles(sketch: DataFrame, by: Sequence[str], quantiles: Sequence[float] = (0.5, 0.9, 0.95),
+                     within_24h: bool = True, **filters) -> DataFrame:
+    """Estimate turnaround time quantiles in hours per group from a sketch.
+
+    by and the keyword filters may use 'modalitet', 'interval_svarad' and the date attributes year, month, day,
+    weekday, date and datum, like cube.cube_counts. They are added to the sketch unless it already has them (see
+    with_calendar). With within_24h only referrals answered within 24 hours count.
+    Returns the groups with their number of referrals in 'antal' and one column per quantile, e.g. '50%'.
+    """
+    sk = with_calendar(sketch) if (set(by) | set(filters)) - set(sketch.columns) else sketch
+    mask = np.ones(len(sk), dtype=bool)
+    for name, values in filters.items():
+        mask &= sk[name].isin(values).to_numpy()
+    if within_24h:
+        mask &= sk['bin'].to_numpy() < N_BINS
+    sk = sk[mask]
+
+    if len(by):
+        g = sk.groupby(list(by), sort=True)
+        codes = g.ngroup().to_numpy()
+        table = g['antal'].sum().reset_index()
+    else:
+        codes = np.zeros(len(sk), dtype='int64')
+        table = DataFrame({'antal': [sk['antal'].sum()]})
+
+    # En rad per grupp och bin, sorterade på grupp och bin.
+    key = codes * (N_BINS + 2) + sk['bin'].to_numpy().astype('int64') + 1
+    keys, inverse = np.unique(key, return_inverse=True)
+    c = np.bincount(inverse.ravel(), weights=sk['antal'].to_numpy(), minlength=len(keys))
+    bins = keys % (N_BINS + 2) - 1
+    cum = np.cumsum(c)
+    n = table['antal'].to_numpy().astype(float)
+    before = np.concatenate([[0], np.cumsum(n)[:-1]])
+
+    for q in quantiles:
+        # Rangen (0-baserad) för kvantilen i varje grupp, och binnen den hamnar i. Inom en bin antas tiderna
+        # ligga jämnt fördelade.
+        rank = before + q * (n - 1)
+        row = np.searchsorted(cum, rank, side='right')
+        inside = rank - (cum[row] - c[row]) + 0.5
+        table['{:g}%'.format(q * 100)] = (bins[row] + inside / c[row]) / 60.0
+    return table
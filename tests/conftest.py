@@ -0,0 +1,22 @@
+import pytest
+
+HEADER = ('bestallning_uid|bestallningstidpunkt|remiss_datum|remiss_tid|prioritet|akut|bestalld_från_vårdenhet_id|'
+          'vardenhet_namn|undersokningstid|undersokning|till_sektion|lab_kombikakod|lab_vardenhet|svarstyp|svar_mottogs')
+ROWS = [
+    ('Akut', '', 'DT buk', '2017-01-10 08:00:00', '2017-01-10 09:30:00'),
+    ('Akut', '', 'Ultraljud lever', '2017-02-03 17:15:00', '2017-02-03 19:00:00'),
+    ('', '1.0', 'Lungröntgen', '2017-03-20 02:00:00', '2017-03-20 03:10:00'),
+    ('Normal', '', 'DT thorax', '2017-03-21 10:00:00', '2017-03-21 12:00:00'),
+]
+
+
+@pytest.fixture
+def dump(tmp_path) -> str:
+    """A small dump with three acute referrals in January to March 2017 and one non-acute"""
+    lines = [HEADER]
+    for i, (prioritet, akut, undersokning, skapad, svarad) in enumerate(ROWS):
+        lines.append('|'.join([str(i), skapad, skapad[:10], skapad, prioritet, akut, 'A1', 'Akutmottagningen', skapad,
+                               undersokning, 'DT', 'RTG', 'Huddinge', 'Slutsvar', svarad]))
+    path = tmp_path / 'dump.csv'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
@@ -0,0 +1,27 @@
+import pandas as pd
+from pandas import DataFrame
+
+from remissfl.backlog import peak_backlog
+
+
+def _frame() -> DataFrame:
+    # Två DT-remisser som är öppna samtidigt 08:10 - 08:20 och en UL-remiss senare samma dag.
+    return DataFrame({
+        'modalitet': ['DT', 'DT', 'UL'],
+        'bestallningstidpunkt': pd.to_datetime(['2017-01-10 08:00', '2017-01-10 08:10', '2017-01-10 10:00']),
+        'svar_mottogs': pd.to_datetime(['2017-01-10 08:20', '2017-01-10 08:30', '2017-01-10 10:05'])
+    })
+
+
+def test_peak_backlog():
+    result = peak_backlog(_frame(), by=('modalitet',))
+    assert result.modalitet.tolist() == ['Alla', 'DT', 'UL']
+    assert result.max_öppna.tolist() == [2, 2, 1]
+    assert result.tidpunkt.tolist() == [pd.Timestamp('2017-01-10 08:10')] * 2 + [pd.Timestamp('2017-01-10 10:00')]
+
+
+def test_peak_backlog_empty_grid():
+    # start efter end ger inga rutnätstider.
+    result = peak_backlog(_frame(), start=pd.Timestamp('2017-02-01'), end=pd.Timestamp('2017-01-01'))
+    assert result.empty
+    assert result.columns.tolist() == ['modalitet', 'interval', 'max_öppna', 'tidpunkt', 'medel_öppna']
@@ -0,0 +1,22 @@
+from remissfl.cube import covered_months, calendar_grid
+from remissfl.pipeline import Analysis
+
+
+def test_covered_months(dump, tmp_path):
+    a = Analysis(dump, str(tmp_path))
+    assert covered_months(a.cubes['svarade']) == ((2017, 1), (2017, 3))
+    grid = calendar_grid(a.table('_b_dag_by_month'), 'month', a.years, covered_months(a.cubes['svarade']))
+    assert grid.shape == (1, 12)
+    assert grid.mask.tolist() == [[False] * 3 + [True] * 9]
+    assert grid.compressed().tolist() == [1.0, 0.0, 0.0]
+
+
+def test_empty_window(dump, tmp_path):
+    # Inga besvarade remisser i perioden: inga månader att maskera och inga figurer att rita.
+    a = Analysis(dump, str(tmp_path), start='2030-01-01', end='2030-02-01')
+    assert covered_months(a.cubes['svarade']) is None
+    assert a.years == []
+    grids = a.calendar_grids()
+    assert grids['_b_dag_by_month'].shape == (0, 12)
+    assert grids['_b_jour_by_weekday'].shape == (0, 7)
+    assert a.figures == []
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from remissfl.ingest import is_acute, merge_acute
+
+
+def _frame() -> DataFrame:
+    # Alla kombinationer av 'prioritet' (saknas, tom, 'Normal', annan) och 'akut' (saknas, 0, 1).
+    prioriteter = [np.nan, '', 'Normal', 'Akut', 'Förtur', 'normal']
+    akut = [np.nan, 0.0, 1.0]
+    rows = [(p, a) for p in prioriteter for a in akut]
+    return DataFrame({'prioritet': [p for p, _ in rows], 'akut': [a for _, a in rows]}, index=np.arange(len(rows)) * 3)
+
+
+def test_merge_acute_equals_is_acute():
+    df = _frame()
+    pd.testing.assert_series_equal(merge_acute(df), df.apply(is_acute, axis=1).astype(float))
+
+
+def test_merge_acute_equals_is_acute_categorical():
+    # Den kolumnära lagringen läser 'prioritet' som kategori.
+    df = _frame().astype({'prioritet': 'category'})
+    pd.testing.assert_series_equal(merge_acute(df), df.apply(is_acute, axis=1).astype(float))
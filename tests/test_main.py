@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from remissfl.__main__ import main
+from remissfl.pipeline import Analysis
+
+
+def test_new_work_dir(dump, tmp_path):
+    # Arbetskatalogen och dess underkataloger finns inte innan körningen.
+    work_dir = str(tmp_path / 'ny' / 'körning')
+    main([dump, '--work-dir', work_dir, '--outputs', 'selections'])
+    assert os.path.exists(os.path.join(work_dir, 'modality_cache.sqlite'))
+    assert os.path.exists(os.path.join(work_dir, 'selections', 'dt.txt'))
+    assert os.path.exists(os.path.join(work_dir, 'manifest.json'))
+
+
+def test_workbooks_in_new_work_dir(dump, tmp_path):
+    pytest.importorskip('xlsxwriter')
+    a = Analysis(dump, str(tmp_path / 'ny'))
+    a.write_workbooks()
+    a.write_backlog()
+    assert os.path.exists(os.path.join(a.xlsx_dir, 'köer_per_intervall.xlsx'))
+
+
+def test_summary_empty_window(dump, tmp_path, capsys):
+    main([dump, '--work-dir', str(tmp_path), '--from', '2030-01-01', '--to', '2030-02-01', '--outputs', 'summary'])
+    assert 'Inga akuta remisser besvarades i perioden.' in capsys.readouterr().out
@@ -0,0 +1,24 @@
+import pandas as pd
+
+from remissfl.pipeline import Analysis, TABLES
+from remissfl.streaming import stream_aggregate
+from remissfl.ingest import read_dump_chunks
+
+
+def test_chunks_equal_whole_dump(dump, tmp_path):
+    # En rad per del, så att varje sträng klassas i sin egen del.
+    whole, chunked = Analysis(dump, str(tmp_path)), Analysis(dump, str(tmp_path), chunksize=1)
+    for name in TABLES:
+        pd.testing.assert_frame_equal(chunked.table(name), whole.table(name))
+    pd.testing.assert_series_equal(chunked.undersokning_counts, whole.undersokning_counts)
+    # Indexet är str när delarna läses direkt från CSV men object från den kolumnära lagringen.
+    pd.testing.assert_frame_equal(chunked.streamed.classes.sort_index(), whole.classification[1].sort_index(),
+                                  check_index_type=False)
+
+
+def test_progress(dump, tmp_path):
+    rows = []
+    streamed = stream_aggregate(read_dump_chunks(dump, 3), Analysis(dump, str(tmp_path)).acute_rows,
+                                progress=rows.append)
+    assert rows == [3, 4]
+    assert streamed.rows == 4